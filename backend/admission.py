@@ -0,0 +1,264 @@
+"""
+Admission Control Module
+Protects the CPU-heavy routes (extraction, image upload) from clients that
+hammer them, so interactive brokers keep predictable latency:
+
+- A token bucket per client (allow-listed API key, else IP) and route limits
+  the request rate. Buckets live in a SQLite file shared by every worker on the host, a
+  local stand-in for a shared store such as Redis.
+- A bounded semaphore per route caps concurrent requests in each worker, with
+  a short bounded wait queue in front of it.
+
+Rejections are immediate: 429 when the client is over its rate, 503 when the
+route is saturated, both with Retry-After.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTIONS
+
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# "sqlite" shares buckets across workers; "memory" keeps them per process
+ADMISSION_STORE = os.getenv("ADMISSION_STORE", "sqlite")
+ADMISSION_DB_PATH = os.getenv(
+    "ADMISSION_DB_PATH", os.path.join(os.path.dirname(__file__), "admission.sqlite3")
+)
+# Comma-separated API keys that get their own buckets; any other X-API-Key is
+# ignored and the client is limited by IP, so rotating made-up keys gains nothing
+ADMISSION_API_KEYS = frozenset(
+    key.strip() for key in os.getenv("ADMISSION_API_KEYS", "").split(",") if key.strip()
+)
+# Use the first X-Forwarded-For address as the client IP (behind a proxy only)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Buckets idle for this long are pruned from the shared store
+BUCKET_IDLE_SECONDS = 3600
+PRUNE_EVERY = 1000
+
+
+@dataclass
+class RoutePolicy:
+    name: str
+    path_pattern: str
+    rate_per_minute: float
+    burst: int
+    concurrency: int
+    queue_size: int
+    queue_timeout: float
+    methods: Tuple[str, ...] = ("POST",)
+
+    def __post_init__(self):
+        self.path_regex = re.compile(self.path_pattern)
+
+
+def _env_number(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def default_policies() -> List[RoutePolicy]:
+    queue_timeout = _env_number("ADMISSION_QUEUE_TIMEOUT_SECONDS", 2)
+    return [
+        RoutePolicy(
+            name="extract",
+            path_pattern=r"^/api/extract(?:/listings)?$",
+            rate_per_minute=_env_number("EXTRACT_RATE_PER_MINUTE", 60),
+            burst=int(_env_number("EXTRACT_BURST", 20)),
+            concurrency=int(_env_number("EXTRACT_CONCURRENCY", 4)),
+            queue_size=int(_env_number("EXTRACT_QUEUE_SIZE", 16)),
+            queue_timeout=queue_timeout,
+        ),
+        RoutePolicy(
+            name="upload",
+            path_pattern=r"^/api/upload-image/[^/]+$",
+            rate_per_minute=_env_number("UPLOAD_RATE_PER_MINUTE", 20),
+            burst=int(_env_number("UPLOAD_BURST", 10)),
+            concurrency=int(_env_number("UPLOAD_CONCURRENCY", 2)),
+            queue_size=int(_env_number("UPLOAD_QUEUE_SIZE", 8)),
+            queue_timeout=queue_timeout,
+        ),
+    ]
+
+
+def _refill(tokens: Optional[float], updated: float, now: float,
+            rate: float, burst: float, cost: float) -> Tuple[float, bool, float]:
+    """Token bucket step: (tokens left, allowed, seconds until allowed)"""
+    tokens = burst if tokens is None else min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Per-process token buckets"""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            tokens, allowed, retry_after = _refill(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+        return allowed, retry_after
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, updated in one short IMMEDIATE transaction
+    per request so every worker process on the host shares them. If the file
+    is locked for longer than the busy timeout the request is let through:
+    rate limiting fails open rather than failing requests.
+
+    take() blocks for up to the busy timeout, so the middleware calls it from a
+    worker thread rather than on the event loop.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = ADMISSION_DB_PATH, busy_timeout: float = 0.05):
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, allowed, retry_after = _refill(
+                    row[0] if row else None, row[1] if row else now, now, rate, burst, cost
+                )
+                self._conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (key, tokens, now)
+                )
+                self._calls += 1
+                if self._calls % PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM buckets WHERE updated < ?", (now - BUCKET_IDLE_SECONDS,))
+                self._conn.execute("COMMIT")
+                return allowed, retry_after
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                print(f"Admission store error: {str(e)}; admitting request")
+                return True, 0.0
+
+
+def client_key(scope, api_keys: frozenset = ADMISSION_API_KEYS) -> str:
+    """API key (hashed) when X-API-Key is an allow-listed key, else the IP address"""
+    headers = dict(scope.get("headers") or [])
+    api_key = headers.get(b"x-api-key")
+    if api_key and api_key.decode("latin-1") in api_keys:
+        return "key:" + hashlib.sha1(api_key).hexdigest()[:16]
+    forwarded = headers.get(b"x-forwarded-for")
+    if TRUST_FORWARDED_FOR and forwarded:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class _RouteGate:
+    """Concurrency slots for one route in this worker, with a bounded wait queue"""
+
+    def __init__(self, policy: RoutePolicy):
+        self.policy = policy
+        self.semaphore = asyncio.Semaphore(policy.concurrency)
+        self.waiting = 0
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and concurrency caps per route"""
+
+    def __init__(self, app, policies: Optional[List[RoutePolicy]] = None, store=None):
+        self.app = app
+        self.policies = policies if policies is not None else default_policies()
+        self.store = store or (SQLiteBucketStore() if ADMISSION_STORE == "sqlite" else MemoryBucketStore())
+        self.gates = {policy.name: _RouteGate(policy) for policy in self.policies}
+
+    def _policy(self, scope) -> Optional[RoutePolicy]:
+        for policy in self.policies:
+            if scope["method"] in policy.methods and policy.path_regex.match(scope["path"]):
+                return policy
+        return None
+
+    async def __call__(self, scope, receive, send):
+        policy = self._policy(scope) if scope["type"] == "http" else None
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        take_args = (f"{policy.name}:{client_key(scope)}", policy.rate_per_minute / 60.0, policy.burst)
+        if getattr(self.store, "blocking", False):
+            allowed, retry_after = await asyncio.to_thread(self.store.take, *take_args)
+        else:
+            allowed, retry_after = self.store.take(*take_args)
+        if not allowed:
+            ADMISSION_REJECTIONS.labels(route=policy.name, reason="rate_limited").inc()
+            await _reject(send, 429, "Rate limit exceeded", retry_after)
+            return
+
+        gate = self.gates[policy.name]
+        if gate.semaphore.locked() and gate.waiting >= policy.queue_size:
+            ADMISSION_REJECTIONS.labels(route=policy.name, reason="queue_full").inc()
+            await _reject(send, 503, "Server busy", policy.queue_timeout)
+            return
+
+        gate.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(gate.semaphore.acquire(), timeout=policy.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTIONS.labels(route=policy.name, reason="queue_timeout").inc()
+            await _reject(send, 503, "Server busy", policy.queue_timeout)
+            return
+        finally:
+            gate.waiting -= 1
+        ADMISSION_QUEUE_WAIT.labels(route=policy.name).observe(time.perf_counter() - start)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.semaphore.release()
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -4,14 +4,87 @@ This module uses pattern matching and NLP techniques to extract property details
 from unstructured WhatsApp messages.
 """
 
+import hashlib
+import json
 import re
+import time
+from datetime import date
 from typing import Dict, Optional, List, Tuple
 
+from geo import LOCALITY_COORDINATES, locality_point
+from metrics import EXTRACTION_STAGE_DURATION, timed
+
+# Per-message wall clock budget; stages that would start after it are skipped
+# and the result is flagged with extraction_partial
+EXTRACTION_TIME_BUDGET_MS = 50
+
+# How much of the message each field stage scans. Listing details sit near the
+# top of a message; contact numbers are often at the very end.
+FIELD_SCAN_LIMITS = {
+    'property_type': 4000,
+    'transaction_type': 4000,
+    'location': 4000,
+    'price': 4000,
+    'carpet_area': 4000,
+    'contact': 20000,
+    'furnishing': 4000,
+    'intent': 4000,
+    'availability': 4000,
+}
+
+# Upper bound on listing blocks extracted from a single broker blast
+MAX_LISTINGS_PER_MESSAGE = 50
+
+# How much of a broker blast is split into listing blocks
+BLAST_SCAN_LIMIT = 20000
+
+# Bump when extraction logic changes without a pattern change, so stored
+# listings are picked up by the re-extraction job (reextract.py)
+EXTRACTOR_LOGIC_VERSION = 1
+
+# Fields owned by the extractor, rewritten when a listing is re-extracted
+EXTRACTED_FIELDS = [
+    'property_type', 'bhk', 'transaction_type', 'location', 'area', 'region',
+    'price', 'carpet_area', 'furnishing', 'contact_number', 'confidence_score',
+    'input_truncated', 'extraction_partial', 'listing_intent', 'price_value',
+    'geo', 'availability', 'available_from',
+]
+
+# Extracted fields a broker may correct by hand (PUT); re-extraction leaves
+# corrected fields, fields inherited from a blast's preamble (inherited_fields)
+# and fields derived from either alone
+EDITABLE_FIELDS = [
+    field for field in EXTRACTED_FIELDS
+    if field not in ('confidence_score', 'input_truncated', 'extraction_partial')
+]
+DERIVED_FROM = {
+    'price_value': ('price',),
+    'geo': ('area', 'location'),
+    'region': ('area', 'location'),
+    'available_from': ('availability',),
+}
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+# Rupee multipliers for price units
+PRICE_UNITS = {
+    'lac': 100000, 'lakh': 100000, 'lakhs': 100000,
+    'cr': 10000000, 'crore': 10000000, 'crores': 10000000,
+    'k': 1000, 'thousand': 1000,
+}
+
 
 class PropertyExtractor:
     """Main class for extracting property information from text"""
     
-    def __init__(self):
+    def __init__(self, time_budget_ms: float = EXTRACTION_TIME_BUDGET_MS,
+                 field_scan_limits: Optional[Dict[str, int]] = None):
+        self.time_budget_ms = time_budget_ms
+        self.field_scan_limits = {**FIELD_SCAN_LIMITS, **(field_scan_limits or {})}
+        
         # Property type patterns
         self.property_patterns = {
             'residential': {
@@ -72,12 +145,162 @@ class PropertyExtractor:
             'Semi-Furnished': r'\bsemi\s*furnished\b|\bsemi\b',
             'Unfurnished': r'\bunfurnished\b|\bbare\b',
         }
+        
+        # Availability / possession wording
+        self.availability_patterns = {
+            'Immediate': r'\bimmediate(?:ly)?\b|\bready\s{0,3}(?:to\s{0,3}move|possession)\b|\bavailable\s{0,3}now\b',
+            'Under Construction': r'\bunder\s{0,3}construction\b|\bunder\s{0,3}const\b',
+        }
+        # "available from 15th March", "possession by Dec", "vacant from 1 jan"
+        self.available_from_pattern = (
+            r'\b(?:available|possession|vacant|ready)\s{1,3}(?:from|by|in|on)\s{1,3}'
+            r'(?:(\d{1,2})(?:st|nd|rd|th)?\s{0,3})?'
+            r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]{0,6}\b'
+        )
+        
+        # Demand-side wording (English and Hinglish) that marks a requirement
+        # on its own, even next to "for rent"/"for sale"
+        self.requirement_patterns = [
+            r'\bchahiye\b|\bchaiye\b|\bjoiye\b',
+            r'\brequired\b|\brequirement\b',
+            r'\blooking\s{1,3}for\b|\bin\s{1,3}search\s{1,3}of\b',
+            r'\b(?:needs?|needed|wants?|wanted)\s{0,3}:?\s{0,3}(?:an?\s{1,3})?'
+            r'(?:\d{1,2}\s{0,2}(?:bhk|rk)|flat|shop|office|house|apartment|room|property)',
+            # "Flat wanted in Bandra"
+            r'\b(?:\d{1,2}\s{0,2}(?:bhk|rk)|flat|shop|office|house|apartment|room|property)\s{1,3}'
+            r'(?:is\s{1,3})?(?:wanted|needed)\b',
+        ]
+        # Weaker demand words: a requirement only when every group is present
+        # ("need ... budget 25k") and the message has no offer wording
+        self.weak_requirement_patterns = [
+            r'\bneed(?:s|ed)?\b|\bwant(?:s|ed)?\b',
+            r'\bbudget\b',
+        ]
+        # Offer wording; beats the weak demand words
+        self.offer_patterns = [
+            r'\bfor\s{1,3}(?:rent|sale|resale|lease)\b|\bon\s{1,3}(?:rent|lease)\b|\bto\s{1,3}let\b',
+            r'\bavailable\b',
+        ]
+        # Demand words that belong to an offer ("family needed", "no deposit
+        # needed", "looking for tenants", "within your budget"); removed before
+        # classifying
+        self.offer_phrase_patterns = [
+            r'\b(?:tenants?|family|families|bachelors?|buyers?|deposit|brokerage)\s{1,3}'
+            r'(?:is\s{1,3}|are\s{1,3})?(?:needed|wanted|required)\b',
+            r'\b(?:needs?|needed|wants?|wanted|required|looking\s{1,3}for|in\s{1,3}search\s{1,3}of|'
+            r'requirement\s{1,3}(?:of|for))\s{0,3}:?\s{0,3}(?:an?\s{1,3}|good\s{1,3}|suitable\s{1,3})?'
+            r'(?:tenants?|family|families|bachelors?|buyers?|purchasers?|occupants?)\b',
+            r'\b(?:your|any|every|all)\s{1,3}budgets?\b',
+        ]
+        
+        # Generic location patterns, used when no known area is mentioned.
+        # Captures are a bounded greedy run with nothing after it, so a long
+        # message without punctuation cannot trigger backtracking.
+        self.location_patterns = [
+            r'(?:\b(?:at|in|near)|@)\s{1,5}([A-Za-z][A-Za-z ]{0,39})',
+            r'location[:\s]{1,5}([A-Za-z][A-Za-z ]{0,39})',
+        ]
+        
+        # Price patterns for Indian currency. Amounts are bounded and may only
+        # start at a number boundary, which keeps long digit runs linear.
+        amount = r'(?<![\d,.])(\d{1,9}(?:,\d{1,3}){0,4}(?:\.\d{1,2})?)'
+        unit = r'(?:lac|lakh|lakhs|cr|crore|crores|k|thousand)'
+        self.price_patterns = [
+            r'₹\s{0,3}' + amount + r'\s{0,3}' + unit + '?',
+            r'rs\.?\s{0,3}' + amount + r'\s{0,3}' + unit + '?',
+            amount + r'\s{0,3}' + unit,
+            r'price[:\s]{1,5}(?:₹|rs\.?)?\s{0,3}' + amount,
+            r'rent[:\s]{1,5}(?:₹|rs\.?)?\s{0,3}(?<![\d,.])(\d{1,9}(?:,\d{1,3}){0,4})',
+        ]
+        
+        # Carpet area patterns (sq ft)
+        self.carpet_area_patterns = [
+            r'(?<![\d,.])(\d{1,6}(?:,\d{1,3})?)\s{0,3}(?:sq\.?\s{0,3}ft|sqft|square\s{0,3}feet)',
+            r'carpet\s*area[:\s]{1,5}(\d{1,6}(?:,\d{1,3})?)',
+            r'area[:\s]{1,5}(\d{1,6}(?:,\d{1,3})?)\s{0,3}(?:sq\.?\s{0,3}ft|sqft)',
+        ]
+        
+        # Numbered listing markers at the start of a line: "1.", "2)", "(3)", "4 -"
+        self.numbered_marker_pattern = r'^\s*\(?\d{1,2}\s*[.)\]:-]\s'
+        
+        # Indian phone numbers
+        self.contact_patterns = [
+            r'\+91[\s-]?\d{10}',
+            r'\b[6-9]\d{9}\b',
+            r'\b\d{5}[\s-]?\d{5}\b',
+        ]
+        
+        self._compile_patterns()
+        self.version = self._config_version()
+    
+    def _config_version(self) -> str:
+        """Fingerprint of the pattern configuration and extraction logic version"""
+        config = {
+            'logic': EXTRACTOR_LOGIC_VERSION,
+            'property_patterns': self.property_patterns,
+            'transaction_patterns': self.transaction_patterns,
+            'mumbai_areas': self.mumbai_areas,
+            'locality_coordinates': LOCALITY_COORDINATES,
+            'furnishing_patterns': self.furnishing_patterns,
+            'location_patterns': self.location_patterns,
+            'price_patterns': self.price_patterns,
+            'carpet_area_patterns': self.carpet_area_patterns,
+            'contact_patterns': self.contact_patterns,
+            'requirement_patterns': self.requirement_patterns,
+            'weak_requirement_patterns': self.weak_requirement_patterns,
+            'offer_patterns': self.offer_patterns,
+            'offer_phrase_patterns': self.offer_phrase_patterns,
+            'availability_patterns': self.availability_patterns,
+            'available_from_pattern': self.available_from_pattern,
+            'field_scan_limits': self.field_scan_limits,
+        }
+        digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8'))
+        return f"{EXTRACTOR_LOGIC_VERSION}-{digest.hexdigest()[:12]}"
     
-    def extract_property_details(self, message: str) -> Dict:
+    def _compile_patterns(self):
+        """Compile every pattern once instead of on each message"""
+        def compile_all(patterns, flags=re.IGNORECASE):
+            return {key: re.compile(pattern, flags) for key, pattern in patterns.items()}
+        
+        self._property_regex = {
+            category: compile_all(patterns)
+            for category, patterns in self.property_patterns.items()
+        }
+        self._transaction_regex = compile_all(self.transaction_patterns)
+        self._furnishing_regex = compile_all(self.furnishing_patterns)
+        self._location_regex = [re.compile(p, re.IGNORECASE) for p in self.location_patterns]
+        self._price_regex = [re.compile(p, re.IGNORECASE) for p in self.price_patterns]
+        self._carpet_area_regex = [re.compile(p, re.IGNORECASE) for p in self.carpet_area_patterns]
+        self._contact_regex = [re.compile(p) for p in self.contact_patterns]
+        self._requirement_regex = [re.compile(p, re.IGNORECASE) for p in self.requirement_patterns]
+        self._weak_requirement_regex = [re.compile(p, re.IGNORECASE) for p in self.weak_requirement_patterns]
+        self._offer_regex = [re.compile(p, re.IGNORECASE) for p in self.offer_patterns]
+        self._offer_phrase_regex = [re.compile(p, re.IGNORECASE) for p in self.offer_phrase_patterns]
+        self._availability_regex = compile_all(self.availability_patterns)
+        self._available_from_regex = re.compile(self.available_from_pattern, re.IGNORECASE)
+        self._price_value_regex = re.compile(
+            r'(\d{1,9}(?:,\d{1,3}){0,4}(?:\.\d{1,2})?)\s{0,3}(' + '|'.join(
+                sorted(PRICE_UNITS, key=len, reverse=True)) + r')?\b',
+            re.IGNORECASE
+        )
+        self._numbered_marker_regex = re.compile(self.numbered_marker_pattern)
+        self._area_lookup = [
+            (area.lower(), area, region)
+            for region, areas in self.mumbai_areas.items()
+            for area in areas
+        ]
+    
+    def extract_property_details(self, message: str, deadline: Optional[float] = None) -> Dict:
         """
-        Main extraction method that processes the message and extracts all details
+        Main extraction method that processes the message and extracts all details.
+        Each stage scans a bounded prefix of the message, and stages that would
+        start after the time budget are skipped (extraction_partial is set).
+        deadline (a time.perf_counter() value) overrides the per-message budget.
         """
-        message_lower = message.lower()
+        limits = self.field_scan_limits
+        scan_chars = max(limits.values())
+        text = message[:scan_chars]
+        text_lower = text.lower()
         
         extracted = {
             'property_type': None,
@@ -94,58 +317,101 @@ class PropertyExtractor:
             'owner_name': None,
             'contact_number': None,
             'availability': None,
+            'available_from': None,
+            'listing_intent': 'Offer',
+            'price_value': None,
+            'geo': None,
             'notes': message,
             'raw_message': message,
-            'confidence_score': 0.0
+            'confidence_score': 0.0,
+            'input_truncated': len(message) > scan_chars,
+            'extraction_partial': False,
+            'extractor_version': self.version
         }
         
         confidence_points = 0
         max_points = 8
+        if deadline is None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        
+        def within_budget() -> bool:
+            if time.perf_counter() <= deadline:
+                return True
+            extracted['extraction_partial'] = True
+            return False
         
         # Extract property type and BHK
-        prop_type, bhk = self._extract_property_type(message_lower)
-        if prop_type:
-            extracted['property_type'] = prop_type
-            extracted['bhk'] = bhk
-            confidence_points += 2
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='property_type'):
+                prop_type, bhk = self._extract_property_type(text_lower[:limits['property_type']])
+            if prop_type:
+                extracted['property_type'] = prop_type
+                extracted['bhk'] = bhk
+                confidence_points += 2
         
         # Extract transaction type
-        transaction = self._extract_transaction_type(message_lower)
-        if transaction:
-            extracted['transaction_type'] = transaction
-            confidence_points += 1
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='transaction_type'):
+                transaction = self._extract_transaction_type(text_lower[:limits['transaction_type']])
+            if transaction:
+                extracted['transaction_type'] = transaction
+                confidence_points += 1
         
         # Extract location
-        location, area, region = self._extract_location(message)
-        if location:
-            extracted['location'] = location
-            extracted['area'] = area
-            extracted['region'] = region
-            confidence_points += 2
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='location'):
+                location, area, region = self._extract_location(text[:limits['location']])
+            if location:
+                extracted['location'] = location
+                extracted['area'] = area
+                extracted['region'] = region
+                extracted['geo'] = locality_point(area)
+                confidence_points += 2
         
         # Extract price
-        price = self._extract_price(message)
-        if price:
-            extracted['price'] = price
-            confidence_points += 1
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='price'):
+                price = self._extract_price(text[:limits['price']])
+            if price:
+                extracted['price'] = price
+                extracted['price_value'] = self.parse_price_value(price)
+                confidence_points += 1
         
         # Extract carpet area
-        carpet_area = self._extract_carpet_area(message)
-        if carpet_area:
-            extracted['carpet_area'] = carpet_area
-            confidence_points += 0.5
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='carpet_area'):
+                carpet_area = self._extract_carpet_area(text[:limits['carpet_area']])
+            if carpet_area:
+                extracted['carpet_area'] = carpet_area
+                confidence_points += 0.5
         
         # Extract contact number
-        contact = self._extract_contact(message)
-        if contact:
-            extracted['contact_number'] = contact
-            confidence_points += 1
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='contact'):
+                contact = self._extract_contact(text[:limits['contact']])
+            if contact:
+                extracted['contact_number'] = contact
+                confidence_points += 1
         
         # Extract furnishing
-        furnishing = self._extract_furnishing(message_lower)
-        if furnishing:
-            extracted['furnishing'] = furnishing
-            confidence_points += 0.5
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='furnishing'):
+                furnishing = self._extract_furnishing(text_lower[:limits['furnishing']])
+            if furnishing:
+                extracted['furnishing'] = furnishing
+                confidence_points += 0.5
+        
+        # Classify requirement (demand) vs offer (inventory)
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='intent'):
+                extracted['listing_intent'] = self._extract_intent(text_lower[:limits['intent']])
+        
+        # Extract availability (feeds the listing's expiry)
+        if within_budget():
+            with timed(EXTRACTION_STAGE_DURATION, stage='availability'):
+                availability, available_from = self._extract_availability(text_lower[:limits['availability']])
+            extracted['availability'] = availability
+            extracted['available_from'] = available_from
         
         # Calculate confidence score
         extracted['confidence_score'] = round((confidence_points / max_points) * 100, 2)
@@ -155,26 +421,26 @@ class PropertyExtractor:
     def _extract_property_type(self, message: str) -> Tuple[Optional[str], Optional[str]]:
         """Extract property type and BHK configuration"""
         # Check residential first
-        for bhk, pattern in self.property_patterns['residential'].items():
-            if re.search(pattern, message, re.IGNORECASE):
+        for bhk, regex in self._property_regex['residential'].items():
+            if regex.search(message):
                 return ('Residential', bhk)
         
         # Check commercial
-        for prop_type, pattern in self.property_patterns['commercial'].items():
-            if re.search(pattern, message, re.IGNORECASE):
+        for prop_type, regex in self._property_regex['commercial'].items():
+            if regex.search(message):
                 return ('Commercial', prop_type)
         
         # Check land
-        for land_type, pattern in self.property_patterns['land'].items():
-            if re.search(pattern, message, re.IGNORECASE):
+        for land_type, regex in self._property_regex['land'].items():
+            if regex.search(message):
                 return ('Land', land_type)
         
         return (None, None)
     
     def _extract_transaction_type(self, message: str) -> Optional[str]:
         """Extract whether it's for rent or sale"""
-        for trans_type, pattern in self.transaction_patterns.items():
-            if re.search(pattern, message, re.IGNORECASE):
+        for trans_type, regex in self._transaction_regex.items():
+            if regex.search(message):
                 return trans_type
         return None
     
@@ -182,38 +448,31 @@ class PropertyExtractor:
         """Extract location from Mumbai areas"""
         message_lower = message.lower()
         
-        for region, areas in self.mumbai_areas.items():
-            for area in areas:
-                if area.lower() in message_lower:
-                    return (area, area, region)
+        for area_lower, area, region in self._area_lookup:
+            if area_lower in message_lower:
+                return (area, area, region)
         
         # Try to extract generic location patterns
-        location_patterns = [
-            r'(?:at|in|near|@)\s+([A-Za-z\s]+?)(?:,|\.|$)',
-            r'location[:\s]+([A-Za-z\s]+?)(?:,|\.|$)',
-        ]
-        
-        for pattern in location_patterns:
-            match = re.search(pattern, message, re.IGNORECASE)
+        for regex in self._location_regex:
+            match = regex.search(message)
             if match:
                 location = match.group(1).strip()
                 return (location, location, None)
         
         return (None, None, None)
     
+    def region_for_area(self, area: Optional[str]) -> Optional[str]:
+        """Railway-line region of a known Mumbai area, or None"""
+        area_lower = (area or '').strip().lower()
+        for known_lower, _, region in self._area_lookup:
+            if known_lower == area_lower:
+                return region
+        return None
+    
     def _extract_price(self, message: str) -> Optional[str]:
         """Extract price or rent amount"""
-        # Patterns for Indian currency
-        patterns = [
-            r'₹\s*(\d+(?:,\d+)*(?:\.\d+)?)\s*(?:lac|lakh|lakhs|cr|crore|crores|k|thousand)?',
-            r'rs\.?\s*(\d+(?:,\d+)*(?:\.\d+)?)\s*(?:lac|lakh|lakhs|cr|crore|crores|k|thousand)?',
-            r'(\d+(?:,\d+)*(?:\.\d+)?)\s*(?:lac|lakh|lakhs|cr|crore|crores|k|thousand)',
-            r'price[:\s]+(?:₹|rs\.?)?\s*(\d+(?:,\d+)*(?:\.\d+)?)',
-            r'rent[:\s]+(?:₹|rs\.?)?\s*(\d+(?:,\d+)*)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message, re.IGNORECASE)
+        for regex in self._price_regex:
+            match = regex.search(message)
             if match:
                 return match.group(0)
         
@@ -221,14 +480,8 @@ class PropertyExtractor:
     
     def _extract_carpet_area(self, message: str) -> Optional[str]:
         """Extract carpet area in sq ft"""
-        patterns = [
-            r'(\d+(?:,\d+)?)\s*(?:sq\.?\s*ft|sqft|square\s*feet)',
-            r'carpet\s*area[:\s]+(\d+(?:,\d+)?)',
-            r'area[:\s]+(\d+(?:,\d+)?)\s*(?:sq\.?\s*ft|sqft)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message, re.IGNORECASE)
+        for regex in self._carpet_area_regex:
+            match = regex.search(message)
             if match:
                 return match.group(0)
         
@@ -236,14 +489,8 @@ class PropertyExtractor:
     
     def _extract_contact(self, message: str) -> Optional[str]:
         """Extract Indian phone numbers"""
-        patterns = [
-            r'\+91[\s-]?\d{10}',
-            r'\b[6-9]\d{9}\b',
-            r'\b\d{5}[\s-]?\d{5}\b',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, message)
+        for regex in self._contact_regex:
+            match = regex.search(message)
             if match:
                 return match.group(0)
         
@@ -251,11 +498,144 @@ class PropertyExtractor:
     
     def _extract_furnishing(self, message: str) -> Optional[str]:
         """Extract furnishing status"""
-        for furn_type, pattern in self.furnishing_patterns.items():
-            if re.search(pattern, message, re.IGNORECASE):
+        for furn_type, regex in self._furnishing_regex.items():
+            if regex.search(message):
                 return furn_type
         return None
     
+    def _extract_availability(self, message: str, today: Optional[date] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extract availability and, for "available from <day> <month>", the next
+        such date (ISO format). A month already past refers to next year.
+        """
+        match = self._available_from_regex.search(message)
+        if match:
+            today = today or date.today()
+            month = MONTHS[match.group(2)]
+            day = int(match.group(1) or 1)
+            year = today.year + (1 if month < today.month else 0)
+            try:
+                available_from = date(year, month, day)
+            except ValueError:
+                available_from = date(year, month, 1)
+            return (f"From {available_from.strftime('%d %b %Y')}", available_from.isoformat())
+        
+        for availability, regex in self._availability_regex.items():
+            if regex.search(message):
+                return (availability, None)
+        return (None, None)
+    
+    def _extract_intent(self, message: str) -> str:
+        """Classify a message as a 'Requirement' (someone looking) or an 'Offer'"""
+        for regex in self._offer_phrase_regex:
+            message = regex.sub(' ', message)
+        if any(regex.search(message) for regex in self._requirement_regex):
+            return 'Requirement'
+        if any(regex.search(message) for regex in self._offer_regex):
+            return 'Offer'
+        if all(regex.search(message) for regex in self._weak_requirement_regex):
+            return 'Requirement'
+        return 'Offer'
+    
+    def parse_price_value(self, price: Optional[str]) -> Optional[float]:
+        """Convert an extracted price such as '1.5 Cr' or '25k' to rupees"""
+        if not price:
+            return None
+        match = self._price_value_regex.search(price)
+        if not match:
+            return None
+        amount = float(match.group(1).replace(',', ''))
+        unit = (match.group(2) or '').lower()
+        return amount * PRICE_UNITS.get(unit, 1)
+    
+    def extract_listings(self, message: str) -> Tuple[List[Dict], int]:
+        """
+        Extract every listing in a message. Broker blasts are split into listing
+        blocks first; blocks without their own contact number inherit the one
+        found in the blast's preamble or anywhere else in the message.
+        
+        The whole blast shares one time budget, so blocks reached after it are
+        flagged extraction_partial. Returns (listings, number of blocks dropped
+        beyond MAX_LISTINGS_PER_MESSAGE).
+        """
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        blocks, preamble = self.split_listings(message)
+        if len(blocks) <= 1:
+            return [self.extract_property_details(message, deadline)], 0
+        
+        shared_contact = (
+            self._extract_contact(preamble)
+            or self._extract_contact(message[:self.field_scan_limits['contact']])
+        )
+        
+        listings = []
+        for block in blocks[:MAX_LISTINGS_PER_MESSAGE]:
+            listing = self.extract_property_details(block, deadline)
+            if not listing['contact_number'] and shared_contact:
+                listing['contact_number'] = shared_contact
+                # Not in the block's own raw_message: re-extraction must keep it
+                listing['inherited_fields'] = ['contact_number']
+            listings.append(listing)
+        if len(message) > BLAST_SCAN_LIMIT and len(blocks) <= MAX_LISTINGS_PER_MESSAGE:
+            # The last block was cut off where splitting stopped
+            listings[-1]['input_truncated'] = True
+        return listings, max(0, len(blocks) - MAX_LISTINGS_PER_MESSAGE)
+    
+    def split_listings(self, message: str) -> Tuple[List[str], str]:
+        """
+        Split a multi-listing message into listing blocks.
+        
+        A block starts at a line carrying a listing marker (a number like "1."
+        or "2)", or a leading emoji/bullet) that also names a property type.
+        The marker that starts the most such lines wins, so single listings
+        that decorate every line with a different emoji stay in one piece.
+        Falls back to blank-line separated paragraphs. Returns (blocks,
+        preamble), where preamble is the text before the first block. Only the
+        first BLAST_SCAN_LIMIT characters are split.
+        """
+        message = message[:BLAST_SCAN_LIMIT]
+        lines = message.splitlines()
+        headers_by_marker: Dict[str, List[int]] = {}
+        
+        for index, line in enumerate(lines):
+            marker = self._listing_marker(line)
+            if marker is None:
+                continue
+            prop_type, _ = self._extract_property_type(line.lower())
+            if prop_type:
+                headers_by_marker.setdefault(marker, []).append(index)
+        
+        headers = max(headers_by_marker.values(), key=len, default=[])
+        if len(headers) >= 2:
+            blocks = [
+                "\n".join(lines[start:end]).strip()
+                for start, end in zip(headers, headers[1:] + [len(lines)])
+            ]
+            return blocks, "\n".join(lines[:headers[0]]).strip()
+        
+        # Fall back to paragraphs when each one describes a property
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', message) if p.strip()]
+        listing_paragraphs = [
+            p for p in paragraphs if self._extract_property_type(p.lower())[0]
+        ]
+        if len(listing_paragraphs) >= 2:
+            first = paragraphs.index(listing_paragraphs[0])
+            return listing_paragraphs, "\n".join(paragraphs[:first])
+        
+        return [message], ""
+    
+    def _listing_marker(self, line: str) -> Optional[str]:
+        """Return the listing marker a line starts with ("#" for numbers), if any"""
+        stripped = line.strip()
+        if not stripped:
+            return None
+        if self._numbered_marker_regex.match(stripped):
+            return '#'
+        first = stripped[0]
+        if not first.isalnum() and first not in '₹+(@':
+            return first
+        return None
+    
     def detect_duplicate(self, new_property: Dict, existing_properties: List[Dict]) -> Optional[Dict]:
         """
         Detect if a property already exists based on phone number and text similarity
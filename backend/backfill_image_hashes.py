@@ -0,0 +1,87 @@
+"""
+Image Hash Backfill Job
+Computes the perceptual hash of every uploaded property photo that predates
+image_hash and writes the hashes back in bulk.
+
+Photos are read and hashed in parallel worker processes. Only properties with
+an image and no image_hash are selected, so the job can be interrupted and
+simply run again to continue. Properties whose original upload is missing get
+image_hash: null so they are not retried.
+
+Usage:
+    python backfill_image_hashes.py [--batch-size 200] [--workers 4]
+"""
+
+import argparse
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+
+from database import bulk_update_properties, connect, iter_properties
+from image_handler import compute_image_hash, find_original_image
+from reextract import _batches, _init_worker
+
+
+def hash_batch(documents: List[Dict]) -> List[Dict]:
+    """Hash the original upload of each document; runs in a worker process"""
+    updates = []
+    for doc in documents:
+        image_hash = None
+        path = find_original_image(doc["image_id"])
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    image_hash = compute_image_hash(f.read())
+            except OSError as e:
+                print(f"Could not read {path}: {str(e)}")
+        updates.append({
+            "_id": doc["_id"],
+            "fields": {"image_hash": image_hash, "updated_at": datetime.now().isoformat()}
+        })
+    return updates
+
+
+def run(batch_size: int = 200, workers: Optional[int] = None) -> Dict:
+    """Hash every unhashed property photo"""
+    cursor = iter_properties(
+        {"image_id": 1}, batch_size,
+        query={"image_id": {"$ne": None}, "image_hash": {"$exists": False}}
+    ).sort("_id", 1)
+    totals = {"processed": 0, "hashed": 0}
+    pool = Pool(processes=workers, initializer=_init_worker)
+    try:
+        for updates in pool.imap_unordered(hash_batch, _batches(cursor, batch_size)):
+            bulk_update_properties(updates)
+            totals["processed"] += len(updates)
+            totals["hashed"] += sum(1 for u in updates if u["fields"]["image_hash"])
+            print(f"  processed {totals['processed']}, hashed {totals['hashed']}")
+        pool.close()
+    except KeyboardInterrupt:
+        print("Interrupted; written batches are kept, run again to continue")
+        pool.terminate()
+        raise
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        cursor.close()
+
+    print(f"✓ Image hash backfill complete: {totals['processed']} processed, "
+          f"{totals['hashed']} hashed")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill perceptual hashes of uploaded property photos")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if connect() is None:
+        raise SystemExit(1)
+
+    try:
+        run(args.batch_size, args.workers)
+    except KeyboardInterrupt:
+        raise SystemExit(130)
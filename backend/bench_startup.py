@@ -0,0 +1,85 @@
+"""
+Startup Benchmark
+Times a cold start of the API in fresh interpreters: importing `main`, running
+its startup handlers and answering the first request. MongoDB does not need to
+be running; connecting happens in the background after startup.
+
+Usage:
+    python bench_startup.py [--runs 5] [--slowest-imports 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter per measurement so nothing is already imported
+PROBE = r"""
+import json, time
+import httpx  # test client dependency, not part of the server's start
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    client.get("/")
+    answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "first_request_ms": (answered - started) * 1000,
+    "total_ms": (answered - start) * 1000,
+}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_probe() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int):
+    """Top-level modules of `main` by cumulative import time (python -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    modules, children = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Children are listed before their parent
+        if depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == "main":
+                modules = children
+            children = []
+    return sorted(modules, reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API cold start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--slowest-imports", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    print(f"Cold start over {args.runs} runs (median / max):")
+    for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+        values = [sample[key] for sample in samples]
+        print(f"  {key:<18} {statistics.median(values):8.1f} / {max(values):8.1f}")
+
+    if args.slowest_imports:
+        print("Slowest imports:")
+        for ms, name in slowest_imports(args.slowest_imports):
+            print(f"  {ms:8.1f} ms  {name}")
@@ -1,8 +1,9 @@
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import DeleteOne, MongoClient, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ServerSelectionTimeoutError
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from metrics import track_db
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,27 +11,63 @@ load_dotenv()
 # Get MongoDB URI from environment
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/real_estate")
 
-try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=10000, connectTimeoutMS=10000)
-    # Verify connection
-    client.admin.command('ping')
-    db = client.get_database()
-    print("✓ MongoDB connected successfully")
-except ServerSelectionTimeoutError:
-    print("✗ MongoDB connection failed. Make sure MongoDB is running.")
-    db = None
-except Exception as e:
-    print(f"✗ MongoDB error: {str(e)}")
-    db = None
+# How long delete tombstones are kept for delta sync clients
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Copy/delete rounds for listings edited while they are being archived
+ARCHIVE_ATTEMPTS = 3
+
+# Seconds between reconnection attempts after MongoDB was unreachable
+RECONNECT_INTERVAL_SECONDS = 30
+
+# Connected by the app's warm-up thread (or a script's entry point), not at
+# import time or from request handlers, so neither ever blocks on the network
+client = None
+db = None
+
+
+def connect():
+    """Connect to MongoDB and verify the connection with a ping"""
+    global client, db
+    try:
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=10000, connectTimeoutMS=10000)
+        # Verify connection
+        client.admin.command('ping')
+        db = client.get_database()
+        print("✓ MongoDB connected successfully")
+    except ServerSelectionTimeoutError:
+        print("✗ MongoDB connection failed. Make sure MongoDB is running.")
+        db = None
+    except Exception as e:
+        print(f"✗ MongoDB error: {str(e)}")
+        db = None
+    return db
 
 
 def get_database():
-    """Return database instance"""
+    """Return the database instance, or None until connect() has succeeded"""
     return db
 
 
+def ensure_indexes():
+    """Create the indexes queries rely on (idempotent)"""
+    db = get_database()
+    if db is None:
+        return
+    db.properties.create_index([("geo", "2dsphere")], name="geo_2dsphere")
+    db.properties.create_index([("updated_at", -1)], name="updated_at")
+    db.deleted_properties.create_index([("deleted_at", -1)], name="deleted_at")
+    db.deleted_properties.create_index(
+        [("expire_at", 1)], name="tombstone_ttl", expireAfterSeconds=0
+    )
+    db.properties.create_index([("expires_at", 1)], name="expires_at")
+    db.properties_archive.create_index([("archived_at", -1)], name="archived_at")
+
+
+@track_db("insert_one")
 def save_property(property_data: dict):
     """Save property to MongoDB"""
+    db = get_database()
     if db is None:
         raise Exception("Database not connected")
     
@@ -41,8 +78,62 @@ def save_property(property_data: dict):
     return str(result.inserted_id)
 
 
+@track_db("insert_many")
+def save_properties(properties: list):
+    """Save many properties to MongoDB in one round trip"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    if not properties:
+        return []
+    
+    now = datetime.now().isoformat()
+    for property_data in properties:
+        property_data['created_at'] = now
+        property_data['updated_at'] = now
+    
+    result = db.properties.insert_many(properties)
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+
+@track_db("insert_many")
+def insert_journaled_properties(properties: list):
+    """
+    Insert write-behind documents (with pre-assigned _id and created_at).
+    Unordered, and documents that already made it in on an earlier attempt
+    (duplicate key) are skipped, so a batch can be replayed safely.
+    Returns (index, error) for documents MongoDB rejected for good.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    if not properties:
+        return []
+    
+    # updated_at is the time the listing became visible, so delta sync clients
+    # pick it up even when the flush was delayed
+    now = datetime.now().isoformat()
+    for property_data in properties:
+        property_data['updated_at'] = now
+    
+    try:
+        db.properties.insert_many(properties, ordered=False)
+        return []
+    except BulkWriteError as e:
+        if e.details.get("writeConcernErrors"):
+            raise
+        # Per-document errors other than duplicates (validation, bad geo,
+        # oversized documents) fail the same way on every retry
+        return [
+            (error["index"], error.get("errmsg", ""))
+            for error in e.details.get("writeErrors", []) if error.get("code") != 11000
+        ]
+
+
+@track_db("find_one")
 def get_property(property_id: str):
     """Get property by ID"""
+    db = get_database()
     if db is None:
         raise Exception("Database not connected")
     
@@ -53,16 +144,20 @@ def get_property(property_id: str):
         return None
 
 
+@track_db("find")
 def get_all_properties(limit: int = 100):
     """Get all properties"""
+    db = get_database()
     if db is None:
         raise Exception("Database not connected")
     
     return list(db.properties.find().limit(limit))
 
 
+@track_db("update_one")
 def update_property(property_id: str, property_data: dict):
     """Update property"""
+    db = get_database()
     if db is None:
         raise Exception("Database not connected")
     
@@ -76,11 +171,522 @@ def update_property(property_id: str, property_data: dict):
     return result.modified_count
 
 
+@track_db("find_one_and_update")
+def toggle_favorite_status(property_id: str):
+    """
+    Flip is_favorite atomically with an update pipeline and return the updated
+    document (None if not found), in a single round trip
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    return db.properties.find_one_and_update(
+        {"_id": object_id},
+        [{"$set": {
+            "is_favorite": {"$eq": [{"$ifNull": ["$is_favorite", False]}, False]},
+            "updated_at": datetime.now().isoformat()
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _tag_update(add: list = None, remove: list = None):
+    """
+    Build an update adding and removing tags. One-sided changes use
+    $addToSet/$pull; mixed changes use an order-preserving update pipeline,
+    since one update document cannot both add to and pull from "tags".
+    """
+    add = [tag for tag in dict.fromkeys(add or []) if tag not in (remove or [])]
+    remove = list(remove or [])
+    now = datetime.now().isoformat()
+    
+    if add and not remove:
+        return {"$addToSet": {"tags": {"$each": add}}, "$set": {"updated_at": now}}
+    if remove and not add:
+        return {"$pull": {"tags": {"$in": remove}}, "$set": {"updated_at": now}}
+    
+    # Tags are user input: $literal stops "$raw_message" or "$tags" being
+    # read as field paths inside the pipeline
+    existing = {"$ifNull": ["$tags", []]}
+    add, remove = {"$literal": add}, {"$literal": remove}
+    return [{"$set": {
+        "tags": {"$concatArrays": [
+            {"$filter": {"input": existing, "cond": {"$eq": [{"$in": ["$$this", remove]}, False]}}},
+            {"$filter": {"input": add, "cond": {"$eq": [{"$in": ["$$this", existing]}, False]}}},
+        ]},
+        "updated_at": now
+    }}]
+
+
+@track_db("find_one_and_update")
+def set_tags(property_id: str, tags: list):
+    """Replace the tag list and return the updated document (None if not found)"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    return db.properties.find_one_and_update(
+        {"_id": object_id},
+        {"$set": {"tags": list(dict.fromkeys(tags)), "updated_at": datetime.now().isoformat()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+@track_db("find_one_and_update")
+def modify_tags(property_id: str, add: list = None, remove: list = None):
+    """Add and/or remove tags atomically and return the updated document (None if not found)"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    return db.properties.find_one_and_update(
+        {"_id": object_id},
+        _tag_update(add, remove),
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _object_ids(property_ids: list):
+    from bson.objectid import ObjectId
+    return [ObjectId(property_id) for property_id in property_ids if ObjectId.is_valid(property_id)]
+
+
+@track_db("update_many")
+def bulk_set_favorite(property_ids: list, is_favorite: bool):
+    """Set is_favorite on many properties at once; returns the matched count"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    result = db.properties.update_many(
+        {"_id": {"$in": _object_ids(property_ids)}},
+        {"$set": {"is_favorite": is_favorite, "updated_at": datetime.now().isoformat()}}
+    )
+    return result.matched_count
+
+
+@track_db("update_many")
+def bulk_modify_tags(property_ids: list, add: list = None, remove: list = None):
+    """Add and/or remove tags on many properties at once; returns the matched count"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    result = db.properties.update_many(
+        {"_id": {"$in": _object_ids(property_ids)}},
+        _tag_update(add, remove)
+    )
+    return result.matched_count
+
+
+@track_db("find_one_and_update")
+def update_property_fields(property_id: str, property_data: dict, track_edits: list = None):
+    """
+    Update a property and return the document as it was before the update
+    (None if not found), so callers can derive the new state without a re-read.
+    Fields in track_edits whose value changed are added to edited_fields.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    property_data['updated_at'] = datetime.now().isoformat()
+    before = db.properties.find_one_and_update(
+        {"_id": object_id},
+        {"$set": property_data},
+        return_document=ReturnDocument.BEFORE
+    )
+    edited = [
+        field for field in (track_edits or [])
+        if before is not None and field in property_data and before.get(field) != property_data[field]
+    ]
+    if edited:
+        db.properties.update_one({"_id": object_id}, {"$addToSet": {"edited_fields": {"$each": edited}}})
+    return before
+
+
+@track_db("find_one_and_delete")
+def pop_property(property_id: str):
+    """Delete a property and return the deleted document (None if not found)"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    deleted = db.properties.find_one_and_delete({"_id": object_id})
+    if deleted is not None:
+        record_tombstones([property_id])
+    return deleted
+
+
+def record_tombstones(property_ids: list):
+    """Remember deleted ids so delta sync clients can drop them"""
+    if not property_ids:
+        return
+    db = get_database()
+    now = datetime.now()
+    db.deleted_properties.insert_many([
+        {
+            "property_id": str(property_id),
+            "deleted_at": now.isoformat(),
+            "expire_at": now + timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        }
+        for property_id in property_ids
+    ])
+
+
+@track_db("delete_one")
 def delete_property(property_id: str):
     """Delete property"""
+    db = get_database()
     if db is None:
         raise Exception("Database not connected")
     
     from bson.objectid import ObjectId
     result = db.properties.delete_one({"_id": ObjectId(property_id)})
     return result.deleted_count
+
+
+def iter_stale_properties(extractor_version: str, after_id=None, batch_size: int = 500,
+                          fields: list = None):
+    """
+    Stream properties extracted with a different extractor version, in _id
+    order, starting after after_id. Only raw_message and the given fields are read.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    query = {"extractor_version": {"$ne": extractor_version}}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    
+    projection = {"raw_message": 1, **{field: 1 for field in (fields or [])}}
+    return db.properties.find(query, projection).sort("_id", 1).batch_size(batch_size)
+
+
+@track_db("bulk_write")
+def bulk_update_properties(updates: list):
+    """
+    Apply many {"_id": ..., "fields": {...}} updates in one unordered bulk_write.
+    Callers set updated_at themselves. Returns the number of modified documents.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    if not updates:
+        return 0
+    
+    operations = [
+        UpdateOne({"_id": update["_id"]}, {"$set": update["fields"]})
+        for update in updates
+    ]
+    result = db.properties.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+def iter_properties(projection: dict = None, batch_size: int = 1000, query: dict = None):
+    """Stream every property (optionally filtered/projected) without loading them all at once"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return db.properties.find(query or {}, projection).batch_size(batch_size)
+
+
+@track_db("find_one")
+def get_archived_property(property_id: str):
+    """Get an archived (expired) property by ID"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        return db.properties_archive.find_one({"_id": ObjectId(property_id)})
+    except:
+        return None
+
+
+@track_db("find")
+def get_archived_properties(limit: int = 100):
+    """Most recently archived properties"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return list(db.properties_archive.find().sort("archived_at", -1).limit(limit))
+
+
+@track_db("archive")
+def archive_expired_properties(now: str, limit: int = 500):
+    """
+    Move up to `limit` properties whose expires_at is before `now` to
+    properties_archive, in bulk: copy (idempotent upserts), delete, tombstone.
+    Returns the archived documents.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    expired = {"expires_at": {"$lt": now}}
+    documents = list(db.properties.find(expired).sort("expires_at", 1).limit(limit))
+    if not documents:
+        return []
+    
+    archived_at = datetime.now().isoformat()
+    archived = []
+    for _ in range(ARCHIVE_ATTEMPTS):
+        db.properties_archive.bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, {**doc, "archived_at": archived_at}, upsert=True)
+             for doc in documents],
+            ordered=False
+        )
+        # Delete only the version that was copied: an edit (tags, favorite,
+        # PUT, renew) made since the copy changes updated_at and keeps it live
+        db.properties.bulk_write(
+            [DeleteOne({"_id": doc["_id"], "updated_at": doc.get("updated_at"), **expired})
+             for doc in documents],
+            ordered=False
+        )
+        ids = [doc["_id"] for doc in documents]
+        missed = {doc["_id"] for doc in db.properties.find({"_id": {"$in": ids}}, {"_id": 1})}
+        archived.extend(doc for doc in documents if doc["_id"] not in missed)
+        if not missed:
+            break
+        # Copy the edited listings again if they are still expired; drop the
+        # stale copies of renewed ones
+        documents = list(db.properties.find({"_id": {"$in": list(missed)}, **expired}))
+        renewed = missed - {doc["_id"] for doc in documents}
+        if renewed:
+            db.properties_archive.delete_many({"_id": {"$in": list(renewed)}})
+        if not documents:
+            break
+    else:
+        # Edited on every attempt: stays live until the next sweep
+        db.properties_archive.delete_many({"_id": {"$in": [doc["_id"] for doc in documents]}})
+    
+    record_tombstones([doc["_id"] for doc in archived])
+    return archived
+
+
+@track_db("lease")
+def acquire_lease(name: str, owner: str, seconds: float) -> bool:
+    """
+    Take or renew a named lease shared by all workers (e.g. so only one runs
+    the lifecycle sweep). Returns True while `owner` holds it.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    now = datetime.now()
+    try:
+        db.leases.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Held by another live owner, so the upsert collided with its document
+        return False
+
+
+@track_db("restore")
+def restore_archived_property(property_id: str, property_data: dict):
+    """
+    Move an archived property back to the hot set with property_data applied.
+    Returns the restored document (None if it is not archived).
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    from bson.objectid import ObjectId
+    try:
+        object_id = ObjectId(property_id)
+    except:
+        return None
+    
+    document = db.properties_archive.find_one({"_id": object_id})
+    if document is None:
+        return None
+    document.pop("archived_at", None)
+    document.update(property_data)
+    document["updated_at"] = datetime.now().isoformat()
+    # Insert before deleting so a crash in between cannot lose the listing
+    db.properties.replace_one({"_id": object_id}, document, upsert=True)
+    db.properties_archive.delete_one({"_id": object_id})
+    # Delta sync clients must not see the listing as both changed and deleted
+    db.deleted_properties.delete_many({"property_id": property_id})
+    return document
+
+
+@track_db("find")
+def get_properties_by_ids(property_ids: list):
+    """Fetch many properties in one query, keyed by string id"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return {str(doc["_id"]): doc for doc in db.properties.find({"_id": {"$in": _object_ids(property_ids)}})}
+
+
+@track_db("bulk_write")
+def record_matches(matches: dict):
+    """
+    Push newly matched listing ids onto stored requirements in one bulk_write.
+    matches maps requirement id -> list of listing ids.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    if not matches:
+        return 0
+    
+    from bson.objectid import ObjectId
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(requirement_id)},
+            {
+                "$addToSet": {"matched_listing_ids": {"$each": listing_ids}},
+                "$set": {"updated_at": datetime.now().isoformat()}
+            }
+        )
+        for requirement_id, listing_ids in matches.items()
+    ]
+    result = db.properties.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+@track_db("geo_near")
+def find_properties_near(longitude: float, latitude: float, radius_km: float,
+                         query: dict = None, limit: int = 100):
+    """
+    Properties within radius_km of a point, nearest first, with distance_km set.
+    $geoNear is served by the 2dsphere index on "geo".
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return list(db.properties.aggregate([
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "key": "geo",
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius_km * 1000,
+            "spherical": True,
+            "query": query or {}
+        }},
+        {"$limit": limit}
+    ]))
+
+
+@track_db("aggregate")
+def facet_counts(base_query: dict, equals: dict, fields, limit: int = 50):
+    """
+    Faceted filtering in one $facet aggregation. Each field's counts apply
+    every filter except that field's own, like the in-process snapshot.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    def matching(exclude=None):
+        return {"$match": {field: value for field, value in equals.items() if field != exclude}}
+    
+    stages = {
+        field: [matching(field), {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+        for field in fields
+    }
+    stages["total"] = [matching(), {"$count": "count"}]
+    stages["favorites"] = [matching(), {"$match": {"is_favorite": True}}, {"$count": "count"}]
+    stages["ids"] = [matching(), {"$sort": {"_id": -1}}, {"$limit": limit}, {"$project": {"_id": 1}}]
+    
+    result = next(db.properties.aggregate([{"$match": base_query}, {"$facet": stages}]))
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "favorites": result["favorites"][0]["count"] if result["favorites"] else 0,
+        "facets": {
+            field: {group["_id"] if group["_id"] is not None else "Unknown": group["count"]
+                    for group in result[field]}
+            for field in fields
+        },
+        "ids": [str(doc["_id"]) for doc in result["ids"]],
+    }
+
+
+@track_db("collection_version")
+def get_collection_version() -> str:
+    """
+    Cheap fingerprint of the properties collection: document count, latest
+    updated_at and latest tombstone. Every write changes at least one of them,
+    and each is answered from an index or collection metadata.
+    """
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    latest = db.properties.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    tombstone = db.deleted_properties.find_one({}, {"deleted_at": 1}, sort=[("deleted_at", -1)])
+    return ":".join([
+        str(db.properties.estimated_document_count()),
+        (latest or {}).get("updated_at", ""),
+        (tombstone or {}).get("deleted_at", ""),
+    ])
+
+
+@track_db("find")
+def get_properties_changed_since(since: str, limit: int = 1000):
+    """Properties updated after an ISO timestamp, oldest change first"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return list(db.properties.find({"updated_at": {"$gt": since}}).sort("updated_at", 1).limit(limit))
+
+
+@track_db("find")
+def get_deleted_since(since: str):
+    """Ids of properties deleted after an ISO timestamp"""
+    db = get_database()
+    if db is None:
+        raise Exception("Database not connected")
+    
+    return [
+        tombstone["property_id"]
+        for tombstone in db.deleted_properties.find({"deleted_at": {"$gt": since}}, {"property_id": 1})
+    ]
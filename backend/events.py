@@ -0,0 +1,262 @@
+"""
+Live Events Module
+Publishes property inserts, updates, deletes and stat deltas to Server-Sent
+Events subscribers (GET /api/properties/stream).
+
+Events are sourced from a MongoDB change stream when the deployment supports
+it (replica set / Atlas). Against a standalone mongod, change streams are not
+available and the request handlers publish to the in-process bus instead.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+EVENT_HISTORY_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 500
+KEEPALIVE_SECONDS = 15
+
+# MongoDB error code for "$changeStream is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+def _serialize(value):
+    """Make a MongoDB document JSON friendly (ObjectId -> str, id from _id)"""
+    if isinstance(value, dict):
+        converted = {k: _serialize(v) for k, v in value.items()}
+        if '_id' in converted and 'id' not in converted:
+            converted['id'] = converted['_id']
+        return converted
+    if isinstance(value, list):
+        return [_serialize(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def stats_delta(before: Optional[Dict], after: Optional[Dict]) -> Dict:
+    """
+    Change to /api/stats counters caused by a write. before/after are the
+    document images (None for an insert/delete respectively).
+    """
+    delta = {"total_properties": 0, "favorites": 0, "by_type": {}, "by_transaction": {}}
+
+    def apply(doc, sign):
+        delta["total_properties"] += sign
+        if doc.get("is_favorite", False):
+            delta["favorites"] += sign
+        for field, bucket in (("property_type", "by_type"), ("transaction_type", "by_transaction")):
+            key = doc.get(field, "Unknown")
+            delta[bucket][key] = delta[bucket].get(key, 0) + sign
+
+    if before is not None:
+        apply(before, -1)
+    if after is not None:
+        apply(after, 1)
+
+    for bucket in ("by_type", "by_transaction"):
+        delta[bucket] = {k: v for k, v in delta[bucket].items() if v}
+    return delta
+
+
+class Subscriber:
+    """One connected stream client"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event: Dict):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBus:
+    """
+    Fan-out of property events to stream subscribers, with a bounded history so
+    reconnecting clients can resume from their Last-Event-ID. Event ids are
+    "<boot id>-<sequence>"; an id from another worker or an event that has
+    already left the history gets a "resync" event instead of a replay.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.change_stream_active = False
+        self._seq = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers: List[Subscriber] = []
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: Dict):
+        """Publish an event to every subscriber; safe to call from any thread"""
+        with self._lock:
+            self._seq += 1
+            event = {"id": f"{self.boot_id}-{self._seq}", "event": event_type, "data": _serialize(data)}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Event listener error: {str(e)}")
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Call listener(event) synchronously on the publishing thread for every event"""
+        self._listeners.append(listener)
+
+    def publish_local(self, event_type: str, data: Dict):
+        """Publish from a request handler, unless the change stream already covers it"""
+        if not self.change_stream_active:
+            self.publish(event_type, data)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Subscriber, List[Dict], bool]:
+        """
+        Register a subscriber. Returns (subscriber, events to replay, needs_resync).
+        """
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if not last_event_id:
+                return subscriber, [], False
+            boot_id, _, seq = last_event_id.partition("-")
+            if boot_id != self.boot_id or not seq.isdigit():
+                return subscriber, [], True
+            seq = int(seq)
+            backlog = [e for e in self._history if int(e["id"].rsplit("-", 1)[1]) > seq]
+            oldest = int(self._history[0]["id"].rsplit("-", 1)[1]) if self._history else self._seq + 1
+            return subscriber, backlog, seq + 1 < oldest
+
+    def current_id(self) -> str:
+        """Id of the latest event, used for resync markers"""
+        return f"{self.boot_id}-{self._seq}"
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+bus = EventBus()
+
+
+def format_sse(event: Dict) -> str:
+    """Encode an event in text/event-stream framing"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def event_stream(request, last_event_id: Optional[str] = None):
+    """Async generator of SSE frames for one client"""
+    subscriber, backlog, resync = bus.subscribe(last_event_id)
+    try:
+        if resync:
+            yield format_sse({"id": bus.current_id(), "event": "resync", "data": {}})
+        for event in backlog:
+            yield format_sse(event)
+        while True:
+            if await request.is_disconnected():
+                break
+            if subscriber.overflowed:
+                # Client fell too far behind; ask it to refetch and start over
+                subscriber.overflowed = False
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                yield format_sse({"id": bus.current_id(), "event": "resync", "data": {}})
+                continue
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        bus.unsubscribe(subscriber)
+
+
+def _publish_change(change: Dict):
+    """Translate a change stream event into a bus event"""
+    operation = change["operationType"]
+    before = change.get("fullDocumentBeforeChange")
+    after = change.get("fullDocument")
+    property_id = str(change.get("documentKey", {}).get("_id"))
+
+    if operation == "insert":
+        bus.publish("insert", {"property": after, "stats_delta": stats_delta(None, after)})
+    elif operation in ("update", "replace"):
+        data = {"id": property_id, "property": after}
+        if before is not None and after is not None:
+            data["stats_delta"] = stats_delta(before, after)
+        else:
+            data["resync_stats"] = True
+        bus.publish("update", data)
+    elif operation == "delete":
+        data = {"id": property_id}
+        if before is not None:
+            data["stats_delta"] = stats_delta(before, None)
+        else:
+            data["resync_stats"] = True
+        bus.publish("delete", data)
+
+
+def _watch_changes(collection, started: threading.Event):
+    resume_token = None
+    # Pre-images need MongoDB 6.0+; fall back to post-images only without them
+    before_images = True
+    while True:
+        try:
+            options = {"full_document": "updateLookup", "resume_after": resume_token}
+            if before_images:
+                options["full_document_before_change"] = "whenAvailable"
+            with collection.watch(**options) as stream:
+                bus.change_stream_active = True
+                started.set()
+                for change in stream:
+                    resume_token = stream.resume_token
+                    _publish_change(change)
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_UNSUPPORTED or (resume_token is None and not before_images):
+                print(f"Change streams unavailable ({e.code}); using in-process events")
+                bus.change_stream_active = False
+                started.set()
+                return
+            if resume_token is None:
+                before_images = False
+                continue
+            print(f"Change stream error: {str(e)}; resuming")
+        except PyMongoError as e:
+            print(f"Change stream error: {str(e)}; resuming")
+        # Writes during the gap are published by handlers until the stream is back
+        bus.change_stream_active = False
+        time.sleep(1)
+
+
+def start_change_stream(collection, timeout: float = 5.0) -> bool:
+    """
+    Start following the collection's change stream in a background thread.
+    Returns True when change streams are in use, False for in-process events.
+    """
+    if collection is None:
+        return False
+    started = threading.Event()
+    thread = threading.Thread(
+        target=_watch_changes, args=(collection, started), name="change-stream", daemon=True
+    )
+    thread.start()
+    started.wait(timeout)
+    return bus.change_stream_active
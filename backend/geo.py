@@ -0,0 +1,123 @@
+"""
+Geo Module
+Offline locality gazetteer for the Mumbai areas known to the extractor, with
+approximate (station) coordinates. Used to store a GeoJSON point on each
+property so listings can be searched by distance through a 2dsphere index.
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+# Locality -> (latitude, longitude), approximate railway station coordinates
+LOCALITY_COORDINATES: Dict[str, Tuple[float, float]] = {
+    # Western line
+    'Churchgate': (18.9322, 72.8264),
+    'Marine Lines': (18.9456, 72.8238),
+    'Charni Road': (18.9517, 72.8187),
+    'Grant Road': (18.9633, 72.8160),
+    'Mumbai Central': (18.9690, 72.8195),
+    'Mahalaxmi': (18.9826, 72.8237),
+    'Lower Parel': (18.9957, 72.8302),
+    'Prabhadevi': (19.0075, 72.8359),
+    'Dadar': (19.0186, 72.8430),
+    'Matunga Road': (19.0277, 72.8468),
+    'Mahim': (19.0410, 72.8402),
+    'Bandra': (19.0544, 72.8406),
+    'Khar Road': (19.0694, 72.8400),
+    'Santacruz': (19.0817, 72.8415),
+    'Vile Parle': (19.0996, 72.8439),
+    'Andheri': (19.1197, 72.8464),
+    'Jogeshwari': (19.1364, 72.8490),
+    'Goregaon': (19.1647, 72.8493),
+    'Malad': (19.1870, 72.8484),
+    'Kandivali': (19.2043, 72.8517),
+    'Borivali': (19.2290, 72.8573),
+    'Dahisar': (19.2500, 72.8594),
+    'Mira Road': (19.2812, 72.8557),
+    'Bhayandar': (19.3117, 72.8526),
+    'Naigaon': (19.3513, 72.8460),
+    'Vasai': (19.3829, 72.8321),
+    'Nallasopara': (19.4180, 72.8186),
+    'Virar': (19.4559, 72.8114),
+    # Central line
+    'CSMT': (18.9398, 72.8355),
+    'Masjid': (18.9515, 72.8389),
+    'Sandhurst Road': (18.9611, 72.8393),
+    'Byculla': (18.9794, 72.8328),
+    'Chinchpokli': (18.9867, 72.8331),
+    'Currey Road': (18.9943, 72.8334),
+    'Parel': (19.0088, 72.8377),
+    'Matunga': (19.0274, 72.8552),
+    'Sion': (19.0470, 72.8630),
+    'Kurla': (19.0653, 72.8794),
+    'Vidyavihar': (19.0792, 72.8972),
+    'Ghatkopar': (19.0860, 72.9081),
+    'Vikhroli': (19.1114, 72.9280),
+    'Kanjurmarg': (19.1295, 72.9281),
+    'Bhandup': (19.1440, 72.9375),
+    'Nahur': (19.1536, 72.9461),
+    'Mulund': (19.1722, 72.9565),
+    'Thane': (19.1863, 72.9758),
+    'Kalwa': (19.1967, 72.9960),
+    'Mumbra': (19.1906, 73.0231),
+    'Diva': (19.1879, 73.0429),
+    'Kopar': (19.2108, 73.0791),
+    'Dombivli': (19.2183, 73.0868),
+    'Thakurli': (19.2251, 73.0977),
+    'Kalyan': (19.2354, 73.1299),
+    'Ulhasnagar': (19.2183, 73.1633),
+    'Ambivli': (19.2683, 73.1721),
+    'Titwala': (19.2953, 73.2039),
+    'Khadavli': (19.3567, 73.2181),
+    'Vasind': (19.4068, 73.2671),
+    'Asangaon': (19.4398, 73.3082),
+    'Atgaon': (19.5014, 73.3263),
+    'Khardi': (19.5755, 73.3938),
+    'Kasara': (19.6447, 73.4732),
+    # Harbour line
+    'Vadala Road': (19.0160, 72.8590),
+    'GTB Nagar': (19.0377, 72.8645),
+    'Chunabhatti': (19.0519, 72.8694),
+    'Tilak Nagar': (19.0665, 72.8900),
+    'Chembur': (19.0622, 72.9005),
+    'Govandi': (19.0553, 72.9153),
+    'Mankhurd': (19.0483, 72.9320),
+    'Vashi': (19.0632, 72.9987),
+    'Sanpada': (19.0622, 73.0112),
+    'Juinagar': (19.0551, 73.0181),
+    'Nerul': (19.0330, 73.0180),
+    'Seawoods': (19.0219, 73.0190),
+    'Belapur': (19.0190, 73.0390),
+    'Kharghar': (19.0266, 73.0595),
+    'Mansarovar': (19.0175, 73.0805),
+    'Khandeshwar': (19.0077, 73.0950),
+    'Panvel': (18.9918, 73.1210),
+}
+
+_LOCALITY_LOOKUP = {name.lower(): name for name in LOCALITY_COORDINATES}
+
+
+def locality_point(locality: Optional[str]) -> Optional[Dict]:
+    """GeoJSON point for a known locality, or None"""
+    if not locality:
+        return None
+    name = _LOCALITY_LOOKUP.get(locality.strip().lower())
+    if name is None:
+        return None
+    lat, lon = LOCALITY_COORDINATES[name]
+    return {'type': 'Point', 'coordinates': [lon, lat]}
+
+
+def resolve_point(near: str) -> Optional[Tuple[float, float]]:
+    """
+    Resolve a `near` query value to (longitude, latitude). Accepts a known
+    locality name ("Andheri") or "lat,lon" coordinates ("19.12,72.85").
+    """
+    match = re.fullmatch(r'\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*', near)
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return (lon, lat)
+        return None
+    point = locality_point(near)
+    return tuple(point['coordinates']) if point else None
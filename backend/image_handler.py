@@ -1,15 +1,21 @@
 import os
 from io import BytesIO
-from PIL import Image
 import base64
+import glob
 from datetime import datetime
 import uuid
 
-# Create uploads directory if it doesn't exist
+from metrics import track_image_stage
+
 UPLOADS_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOADS_DIR, exist_ok=True)
 
 
+def ensure_uploads_dir():
+    """Create uploads directory if it doesn't exist (from the app's startup hook)"""
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+
+@track_image_stage("validate")
 def validate_image(file_content: bytes, max_size_mb: int = 5) -> tuple[bool, str]:
     """Validate image file"""
     max_size = max_size_mb * 1024 * 1024
@@ -17,6 +23,9 @@ def validate_image(file_content: bytes, max_size_mb: int = 5) -> tuple[bool, str
     if len(file_content) > max_size:
         return False, f"File size exceeds {max_size_mb}MB limit"
     
+    # PIL is imported on first use to keep it out of server start-up
+    from PIL import Image
+
     try:
         image = Image.open(BytesIO(file_content))
         image.verify()
@@ -25,8 +34,11 @@ def validate_image(file_content: bytes, max_size_mb: int = 5) -> tuple[bool, str
         return False, f"Invalid image: {str(e)}"
 
 
+@track_image_stage("thumbnail")
 def create_thumbnail(image_bytes: bytes, size: tuple = (200, 200)) -> bytes:
     """Create thumbnail from image bytes"""
+    from PIL import Image
+
     try:
         image = Image.open(BytesIO(image_bytes))
         image.thumbnail(size, Image.Resampling.LANCZOS)
@@ -39,6 +51,33 @@ def create_thumbnail(image_bytes: bytes, size: tuple = (200, 200)) -> bytes:
         return None
 
 
+@track_image_stage("hash")
+def compute_image_hash(image_bytes: bytes, hash_size: int = 8) -> str:
+    """
+    Perceptual difference hash (dHash) as a hex string. Re-compressed or
+    resized copies of the same photo land within a few bits of each other.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        # Let the JPEG decoder downscale while decoding; only a tiny image is needed
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        image = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = list(image.getdata())
+        
+        bits = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return f"{bits:0{hash_size * hash_size // 4}x}"
+    except Exception as e:
+        print(f"Image hash error: {str(e)}")
+        return None
+
+
+@track_image_stage("save")
 def save_image(file_content: bytes, filename: str) -> dict:
     """Save image and create thumbnail"""
     try:
@@ -63,6 +102,7 @@ def save_image(file_content: bytes, filename: str) -> dict:
             "success": True,
             "file_id": file_id,
             "filename": filename,
+            "image_hash": compute_image_hash(file_content),
             "original_path": original_path,
             "thumbnail_path": thumbnail_path,
             "size": len(file_content),
@@ -75,6 +115,7 @@ def save_image(file_content: bytes, filename: str) -> dict:
         }
 
 
+@track_image_stage("read_base64")
 def get_image_base64(file_id: str, thumbnail: bool = False) -> str:
     """Get image as base64 string"""
     try:
@@ -110,3 +151,10 @@ def delete_image(file_id: str) -> bool:
     except Exception as e:
         print(f"Error deleting image: {str(e)}")
         return False
+
+
+def find_original_image(file_id: str) -> str:
+    """Path of the original upload for a file id (any extension), or None"""
+    for path in glob.glob(os.path.join(UPLOADS_DIR, f"{glob.escape(file_id)}.*")):
+        return path
+    return None
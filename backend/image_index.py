@@ -0,0 +1,172 @@
+"""
+Image Similarity Index
+BK-tree over perceptual image hashes, used to find listings that reuse the
+same photos (reposts with rewritten text, WhatsApp re-compression) without
+comparing against every image in the inventory.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Hamming distance (out of 64 bits) at or below which two photos are the same
+DUPLICATE_MAX_DISTANCE = 6
+
+# Rebuild from MongoDB at this interval to pick up other workers' uploads and
+# drop removed entries
+IMAGE_INDEX_REFRESH_SECONDS = 300
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree keyed by Hamming distance. A search with radius r only
+    descends into children whose edge distance is within r of the query's
+    distance to the node, which prunes most of the tree for small r.
+    """
+
+    def __init__(self):
+        # node: [hash, {property ids}, {edge distance: child node}]
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, image_hash: int, property_id: str):
+        self._size += 1
+        if self._root is None:
+            self._root = [image_hash, {property_id}, {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(image_hash, node[0])
+            if distance == 0:
+                node[1].add(property_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [image_hash, {property_id}, {}]
+                return
+            node = child
+
+    def search(self, image_hash: int, max_distance: int) -> List[Tuple[int, str]]:
+        """(distance, property id) pairs within max_distance, closest first"""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(image_hash, node[0])
+            if distance <= max_distance:
+                results.extend((distance, property_id) for property_id in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node[2].items() if low <= edge <= high)
+        results.sort()
+        return results
+
+
+class ImageIndex:
+    """Property photo hashes with periodic background rebuilds"""
+
+    def __init__(self, refresh_seconds: float = IMAGE_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._tree = BKTree()
+        self._hashes: Dict[str, int] = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # Changes made while a rebuild is running, replayed onto the new tree
+        self._pending: Optional[List[tuple]] = None
+        self._refreshing = False
+
+    def load(self, documents: Iterable[Dict]):
+        """(Re)build the tree from property documents carrying image_hash"""
+        with self._lock:
+            self._pending = []
+        tree, hashes = BKTree(), {}
+        try:
+            for doc in documents:
+                if doc.get('image_hash'):
+                    property_id = str(doc['_id'])
+                    hashes[property_id] = int(doc['image_hash'], 16)
+                    tree.add(hashes[property_id], property_id)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for change, property_id, image_hash in self._pending:
+                if change == 'add':
+                    hashes[property_id] = image_hash
+                    tree.add(image_hash, property_id)
+                else:
+                    hashes.pop(property_id, None)
+            self._pending = None
+            self._tree, self._hashes = tree, hashes
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def refresh_in_background(self, fetch_documents: Callable[[], Iterable[Dict]]) -> bool:
+        """
+        Rebuild in a background thread if the index is stale and no rebuild is
+        running; requests keep using the current tree until the swap.
+        Returns True if a rebuild was started.
+        """
+        with self._lock:
+            if self._refreshing or not self.is_stale():
+                return False
+            self._refreshing = True
+
+        def rebuild():
+            try:
+                self.load(fetch_documents())
+            except Exception as e:
+                print(f"Image index rebuild failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=rebuild, name="image-index-rebuild", daemon=True).start()
+        return True
+
+    def add(self, property_id: str, image_hash: Optional[str]):
+        if not image_hash:
+            return
+        with self._lock:
+            self._hashes[property_id] = int(image_hash, 16)
+            self._tree.add(self._hashes[property_id], property_id)
+            if self._pending is not None:
+                self._pending.append(('add', property_id, self._hashes[property_id]))
+
+    def remove(self, property_id: str):
+        # BK-trees do not support deletion; stale nodes are filtered out on
+        # search and dropped at the next rebuild
+        with self._lock:
+            self._hashes.pop(property_id, None)
+            if self._pending is not None:
+                self._pending.append(('remove', property_id, None))
+
+    def similar(self, image_hash: str, max_distance: int = DUPLICATE_MAX_DISTANCE,
+                exclude: Optional[str] = None) -> List[Dict]:
+        """Listings whose photo is within max_distance bits of image_hash"""
+        query = int(image_hash, 16)
+        with self._lock:
+            matches = self._tree.search(query, max_distance)
+            hashes = dict(self._hashes)
+        results, seen = [], set()
+        for distance, property_id in matches:
+            # Skip the listing itself and entries whose photo changed or was removed
+            if property_id == exclude or property_id in seen or hashes.get(property_id) is None:
+                continue
+            if hamming(hashes[property_id], query) != distance:
+                continue
+            seen.add(property_id)
+            results.append({"id": property_id, "distance": distance})
+        return results
+
+
+image_index = ImageIndex()
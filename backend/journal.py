@@ -0,0 +1,186 @@
+"""
+Write-behind Ingestion Module
+Optional write-behind mode for saving listings (WRITE_BEHIND_ENABLED=true):
+accepted listings are appended to a durable local SQLite journal and
+acknowledged at once; a background thread flushes them to MongoDB in batched
+insert_many calls and removes them from the journal only after MongoDB has
+them. Anything still journaled when the process stops is replayed on the
+next start. Documents MongoDB rejects outright (validation errors and the
+like) are moved to a dead_letter table instead of blocking the journal.
+
+Listings get their ObjectId before they are journaled, so a replayed batch
+that partly reached MongoDB is harmless: duplicate key errors are ignored.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import json_util
+from dotenv import load_dotenv
+
+from database import insert_journaled_properties
+from metrics import WRITE_BEHIND_DEAD_LETTERS, WRITE_BEHIND_PENDING
+
+load_dotenv()
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+JOURNAL_PATH = os.getenv(
+    "JOURNAL_PATH", os.path.join(os.path.dirname(__file__), "ingest_journal.sqlite3")
+)
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FLUSH_INTERVAL_SECONDS", "0.5"))
+FLUSH_BATCH_SIZE = 500
+MAX_RETRY_SECONDS = 30
+
+
+class IngestJournal:
+    """Append-only journal of listings not yet written to MongoDB"""
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # An acknowledged listing must survive a power loss
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, property_id TEXT NOT NULL, doc TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pending_property_id ON pending (property_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            "seq INTEGER PRIMARY KEY, property_id TEXT NOT NULL, doc TEXT NOT NULL, "
+            "error TEXT NOT NULL, failed_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def append(self, documents: List[Dict]):
+        """Durably record documents (each with its _id already assigned)"""
+        rows = [(str(doc["_id"]), json_util.dumps(doc)) for doc in documents]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT INTO pending (property_id, doc) VALUES (?, ?)", rows)
+
+    def pending(self, limit: int = FLUSH_BATCH_SIZE) -> List[Tuple[int, Dict]]:
+        """Oldest journaled documents as (seq, document)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, doc FROM pending ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(seq, json_util.loads(doc)) for seq, doc in rows]
+
+    def acknowledge(self, seqs: List[int]):
+        """Drop documents MongoDB has confirmed"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("DELETE FROM pending WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def dead_letter(self, failures: List[Tuple[int, str]]):
+        """Move rejected documents, as (seq, error), out of the pending queue"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dead_letter (seq, property_id, doc, error, failed_at) "
+                    "SELECT seq, property_id, doc, ?, ? FROM pending WHERE seq = ?",
+                    [(error, now, seq) for seq, error in failures]
+                )
+                self._conn.executemany("DELETE FROM pending WHERE seq = ?", [(seq,) for seq, _ in failures])
+
+    def get(self, property_id: str) -> Optional[Dict]:
+        """A listing still waiting to be flushed, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc FROM pending WHERE property_id = ? ORDER BY seq DESC LIMIT 1", (property_id,)
+            ).fetchone()
+        return json_util.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+
+class WriteBehindWriter:
+    """Background flusher from the journal to MongoDB, with backoff while it is down"""
+
+    def __init__(self, journal: IngestJournal, interval: float = FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = FLUSH_BATCH_SIZE,
+                 on_flushed: Optional[Callable[[List[Dict]], None]] = None):
+        self.journal = journal
+        self.interval = interval
+        self.batch_size = batch_size
+        # Called with the documents MongoDB accepted, for follow-up writes that
+        # must not run on the request path while it may be down
+        self.on_flushed = on_flushed
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+
+    def submit(self, documents: List[Dict]):
+        """Journal documents for insertion; returns once they are durable"""
+        self.journal.append(documents)
+        WRITE_BEHIND_PENDING.inc(len(documents))
+        self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write journaled documents to MongoDB until the journal is empty"""
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                batch = self.journal.pending(self.batch_size)
+                if not batch:
+                    return flushed
+                rejected = insert_journaled_properties([doc for _, doc in batch])
+                if rejected:
+                    self.journal.dead_letter([(batch[index][0], error) for index, error in rejected])
+                    WRITE_BEHIND_DEAD_LETTERS.inc(len(rejected))
+                    print(f"Write-behind: {len(rejected)} listings rejected by MongoDB, moved to dead_letter")
+                self.journal.acknowledge([seq for seq, _ in batch])
+                WRITE_BEHIND_PENDING.dec(len(batch))
+                flushed += len(batch)
+                if self.on_flushed is not None:
+                    rejected_indexes = {index for index, _ in rejected}
+                    try:
+                        self.on_flushed([doc for index, (_, doc) in enumerate(batch)
+                                         if index not in rejected_indexes])
+                    except Exception as e:
+                        print(f"Write-behind: follow-up for flushed listings failed: {str(e)}")
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            # Wait for new work, but also wake periodically to retry a backlog
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                delay = self.interval
+            except Exception as e:
+                delay = min(max(delay * 2, 1.0), MAX_RETRY_SECONDS)
+                print(f"Write-behind flush failed ({str(e)}); retrying in {delay:.0f}s")
+                continue
+            # Batch up writes that arrive close together into one insert_many
+            time.sleep(self.interval)
+
+    def start(self):
+        """Replay anything left from a previous run, then keep flushing"""
+        WRITE_BEHIND_PENDING.set(self.journal.count())
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            self._wakeup.set()
+
+
+writer: Optional[WriteBehindWriter] = None
+
+
+def get_writer() -> WriteBehindWriter:
+    """The process-wide writer, opening the journal on first use"""
+    global writer
+    if writer is None:
+        writer = WriteBehindWriter(IngestJournal())
+    return writer
@@ -0,0 +1,150 @@
+"""
+Listing Lifecycle Module
+Listings go stale within weeks. Every listing gets an expires_at when it is
+extracted/saved (availability date + a TTL by transaction type), and a
+periodic sweep moves expired listings from `properties` to
+`properties_archive` in bulk. The hot collection, its indexes and every
+list/stat/match query then only ever see live inventory, however large the
+history grows.
+
+Usage:
+    python lifecycle.py              # archive everything expired now
+    python lifecycle.py --backfill   # set expires_at on listings saved before it existed
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from database import (
+    acquire_lease, archive_expired_properties, bulk_update_properties, connect, iter_properties
+)
+
+load_dotenv()
+
+LIFECYCLE_SWEEP_ENABLED = os.getenv("LIFECYCLE_SWEEP_ENABLED", "true").lower() == "true"
+LIFECYCLE_SWEEP_SECONDS = float(os.getenv("LIFECYCLE_SWEEP_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = 500
+
+# Every worker starts a sweeper, but only the holder of this lease sweeps
+SWEEP_LEASE = "lifecycle-sweep"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Days a listing stays live after it becomes available
+LISTING_TTL_DAYS = {'Rent': 30, 'Sale': 90}
+DEFAULT_TTL_DAYS = 45
+REQUIREMENT_TTL_DAYS = 21
+
+# Listing fields expires_at depends on
+EXPIRY_SOURCE_FIELDS = ('transaction_type', 'listing_intent', 'available_from')
+
+
+def listing_expires_at(listing: Dict, now: Optional[datetime] = None) -> str:
+    """Expiry (ISO timestamp) for a listing, counted from when it becomes available"""
+    start = now or datetime.now()
+    if listing.get('available_from'):
+        try:
+            start = max(start, datetime.fromisoformat(listing['available_from']))
+        except ValueError:
+            pass
+    if listing.get('listing_intent') == 'Requirement':
+        ttl = REQUIREMENT_TTL_DAYS
+    else:
+        ttl = LISTING_TTL_DAYS.get(listing.get('transaction_type'), DEFAULT_TTL_DAYS)
+    return (start + timedelta(days=ttl)).isoformat()
+
+
+def saved_listing_expires_at(listing: Dict) -> str:
+    """
+    Expiry counted from when the listing was saved (created_at), for fields
+    that change after saving (edits, re-extraction, backfill) without renewing it
+    """
+    try:
+        created = datetime.fromisoformat(listing["created_at"])
+    except (KeyError, TypeError, ValueError):
+        created = None
+    return listing_expires_at(listing, created)
+
+
+def sweep(on_archived: Optional[Callable[[List[Dict]], None]] = None,
+          batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Archive every listing expired as of now, one bulk batch at a time.
+    on_archived(documents) is called after each batch. Returns the count.
+    """
+    now = datetime.now().isoformat()
+    total = 0
+    while True:
+        documents = archive_expired_properties(now, batch_size)
+        if documents and on_archived:
+            on_archived(documents)
+        total += len(documents)
+        if len(documents) < batch_size:
+            return total
+
+
+def _sweep_forever(on_archived, interval: float):
+    while True:
+        try:
+            # The lease outlives one interval, so a live holder keeps it and
+            # another worker takes over only after the holder is gone
+            if acquire_lease(SWEEP_LEASE, WORKER_ID, interval * 2):
+                archived = sweep(on_archived)
+                if archived:
+                    print(f"Archived {archived} expired listings")
+        except Exception as e:
+            print(f"Lifecycle sweep error: {str(e)}")
+        time.sleep(interval)
+
+
+def start_sweeper(on_archived: Optional[Callable[[List[Dict]], None]] = None,
+                  interval: float = LIFECYCLE_SWEEP_SECONDS) -> threading.Thread:
+    """
+    Run the sweep now and then every `interval` seconds in a background
+    thread; with several workers only the lease holder sweeps
+    """
+    thread = threading.Thread(
+        target=_sweep_forever, args=(on_archived, interval), name="lifecycle-sweep", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def backfill_expiry(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Set expires_at on listings saved before lifecycle tracking, from
+    created_at. Bumps updated_at so ETags and delta sync clients see it.
+    """
+    projection = {"created_at": 1, "available_from": 1, "listing_intent": 1, "transaction_type": 1}
+    cursor = iter_properties(projection, batch_size, query={"expires_at": {"$exists": False}})
+    updates, total = [], 0
+    now = datetime.now().isoformat()
+    for doc in cursor:
+        updates.append({"_id": doc["_id"],
+                        "fields": {"expires_at": saved_listing_expires_at(doc), "updated_at": now}})
+        if len(updates) >= batch_size:
+            total += bulk_update_properties(updates)
+            updates = []
+    total += bulk_update_properties(updates)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive expired listings")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Set expires_at on listings that have none before sweeping")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if connect() is None:
+        raise SystemExit(1)
+
+    if args.backfill:
+        print(f"✓ expires_at set on {backfill_expiry(args.batch_size)} listings")
+    print(f"✓ Archived {sweep(batch_size=args.batch_size)} expired listings")
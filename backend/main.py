@@ -1,16 +1,43 @@
-from fastapi import FastAPI, HTTPException, Query, File, UploadFile
+from fastapi import FastAPI, HTTPException, Query, File, UploadFile, Header, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import re
-from datetime import datetime
-from ai_extractor import extractor
-from database import save_property, get_property, get_all_properties, update_property, delete_property
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+from ai_extractor import EDITABLE_FIELDS, extractor
+from database import (
+    save_property, save_properties, get_property, get_all_properties, update_property,
+    toggle_favorite_status, set_tags, modify_tags, bulk_set_favorite, bulk_modify_tags,
+    iter_properties, record_matches, ensure_indexes, find_properties_near,
+    update_property_fields, pop_property, connect, get_database, get_properties_by_ids, facet_counts,
+    get_archived_property, get_archived_properties, restore_archived_property,
+    get_collection_version, get_properties_changed_since, get_deleted_since, TOMBSTONE_RETENTION_DAYS,
+    RECONNECT_INTERVAL_SECONDS
+)
+from events import bus, event_stream, start_change_stream, stats_delta
+from geo import locality_point, resolve_point
+from matching import matcher
 from bson.objectid import ObjectId
-from image_handler import validate_image, save_image, get_image_base64, delete_image
+from image_handler import (
+    UPLOADS_DIR, ensure_uploads_dir, validate_image, save_image, get_image_base64, delete_image
+)
+from image_index import image_index, DUPLICATE_MAX_DISTANCE
+from journal import WRITE_BEHIND_ENABLED, get_writer
+from lifecycle import (
+    EXPIRY_SOURCE_FIELDS, LIFECYCLE_SWEEP_ENABLED, listing_expires_at, saved_listing_expires_at, start_sweeper
+)
+from snapshot import snapshot, FACET_SNAPSHOT_ENABLED, FACET_FIELDS, SNAPSHOT_PROJECTION, UNKNOWN
+from metrics import MetricsMiddleware, render_metrics
+from admission import ADMISSION_ENABLED, AdmissionMiddleware
+import profiler
 import os
 import json
+import threading
+import time
 
 
 def convert_objectid(obj):
@@ -29,6 +56,11 @@ def convert_objectid(obj):
 
 app = FastAPI(title="Real Estate AI API")
 
+# Rate limits and concurrency caps for extraction and uploads. Added first so
+# it sits inside CORS (rejections still carry CORS headers) and metrics.
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
 # CORS configuration for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -36,12 +68,107 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Listings-Dropped"],
 )
 
-# Mount uploads directory for static files
-uploads_dir = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Per-route latency and in-flight request metrics
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in sampling profiler for slow requests (PROFILING_ENABLED=true)
+if profiler.PROFILING_ENABLED:
+    app.add_middleware(profiler.ProfilingMiddleware)
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+if FACET_SNAPSHOT_ENABLED:
+    # Every write reaches the bus (from handlers or the change stream)
+    bus.add_listener(snapshot.apply_event)
+
+
+def warm_up():
+    """Connect to MongoDB, then start everything that needs it"""
+    # Keep retrying, so indexes, live events and the sweep start once MongoDB is up
+    # (the only place the app connects; request handlers never wait on it)
+    while get_database() is None and connect() is None:
+        time.sleep(RECONNECT_INTERVAL_SECONDS)
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f"Error creating indexes: {str(e)}")
+    if start_change_stream(get_database().properties):
+        print("✓ Live events sourced from MongoDB change stream")
+    if LIFECYCLE_SWEEP_ENABLED:
+        start_sweeper(on_archived=forget_archived)
+    refresh_matcher()
+    refresh_image_index()
+    if FACET_SNAPSHOT_ENABLED:
+        refresh_snapshot()
+
+
+@app.on_event("startup")
+def start_warm_up():
+    ensure_uploads_dir()
+    # The server accepts requests at once instead of waiting on the MongoDB
+    # ping, index builds and change stream handshake
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_write_behind():
+    if WRITE_BEHIND_ENABLED:
+        # Replays listings journaled before a restart; matches are recorded
+        # from the flush, so a MongoDB outage never blocks a save
+        get_writer().on_flushed = record_flushed_matches
+        get_writer().start()
+
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    if WRITE_BEHIND_ENABLED:
+        try:
+            get_writer().flush()
+        except Exception as e:
+            print(f"Write-behind flush on shutdown failed ({str(e)}); will replay on restart")
+
+
+# Delta sync: server_time lags "now" so writes committed during a sync (or
+# stamped by a worker with a slightly slow clock) are picked up next time
+SYNC_OVERLAP_SECONDS = 5
+DELTA_SYNC_LIMIT = 1000
+
+
+def collection_etag(*parts) -> str:
+    """Weak ETag from the collection version and whatever shapes the response"""
+    version = get_collection_version()
+    digest = hashlib.sha1("|".join([version, *map(str, parts)]).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match covers the current ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+def publish_update(property_id: str, before: Optional[dict], after: dict):
+    """Publish an update event with the stats delta between two document images"""
+    bus.publish_local("update", {
+        "id": property_id,
+        "property": after,
+        "stats_delta": stats_delta(before, after)
+    })
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard admin endpoints with the ADMIN_TOKEN shared secret; closed when it is unset"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Mount uploads directory for static files; it is created by the startup hook
+app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR, check_dir=False), name="uploads")
 
 
 class PropertyData(BaseModel):
@@ -61,6 +188,16 @@ class PropertyData(BaseModel):
     notes: Optional[str] = None
     raw_message: str
     confidence_score: Optional[float] = None
+    region: Optional[str] = None
+    listing_intent: Optional[str] = None  # Offer (inventory) or Requirement (demand)
+    price_value: Optional[float] = None  # Price in rupees, for matching and filtering
+    geo: Optional[dict] = None  # GeoJSON point of the locality, for proximity search
+    available_from: Optional[str] = None  # ISO date from "available from <date>"
+    expires_at: Optional[str] = None  # Archived by the lifecycle sweep after this
+    input_truncated: Optional[bool] = None  # Message longer than the extractor scans
+    extraction_partial: Optional[bool] = None  # Time budget hit, some fields skipped
+    extractor_version: Optional[str] = None  # Pattern config the fields came from
+    inherited_fields: Optional[List[str]] = None  # Copied from a broker blast's preamble
 
 
 class PropertyResponse(BaseModel):
@@ -103,10 +240,120 @@ class PropertyResponse(BaseModel):
     tags: List[str]
 
 
+MATCH_PROJECTION = {
+    "transaction_type": 1, "bhk": 1, "area": 1, "location": 1, "region": 1,
+    "price_value": 1, "listing_intent": 1, "created_at": 1
+}
+
+
+def refresh_matcher():
+    """
+    Rebuild the matching index in the background once it goes stale (or on
+    first use); requests never wait for the collection scan
+    """
+    matcher.refresh_in_background(lambda: iter_properties(MATCH_PROJECTION))
+
+
+def refresh_image_index():
+    """
+    Rebuild the photo hash index in the background once it goes stale (or on
+    first use); uploads and /similar never wait for the collection scan
+    """
+    image_index.refresh_in_background(
+        lambda: iter_properties({"image_hash": 1}, query={"image_hash": {"$ne": None}})
+    )
+
+
+def save_new_properties(property_dicts: List[dict]) -> List[str]:
+    """
+    Save new properties and return their ids. In write-behind mode they get
+    ids up front and are journaled locally; MongoDB receives them shortly after.
+    """
+    if WRITE_BEHIND_ENABLED:
+        now = datetime.now().isoformat()
+        for property_dict in property_dicts:
+            property_dict['_id'] = ObjectId()
+            property_dict['created_at'] = now
+            property_dict['updated_at'] = now
+        get_writer().submit(property_dicts)
+        return [str(property_dict['_id']) for property_dict in property_dicts]
+    if len(property_dicts) == 1:
+        return [save_property(property_dicts[0])]
+    return save_properties(property_dicts)
+
+
+def forget_archived(documents: List[dict]):
+    """Drop archived listings from in-process indexes and tell live clients"""
+    for doc in documents:
+        property_id = str(doc['_id'])
+        matcher.remove(property_id)
+        image_index.remove(property_id)
+        bus.publish_local("delete", {"id": property_id, "archived": True, "stats_delta": stats_delta(doc, None)})
+
+
+def refresh_snapshot():
+    """
+    Rebuild the facet snapshot in the background once it goes stale (or on
+    first use); facet requests never wait for the build
+    """
+    snapshot.refresh_in_background(lambda: iter_properties(SNAPSHOT_PROJECTION))
+
+
+def index_and_match(properties: List[dict], record: bool = True) -> dict:
+    """
+    Add newly saved properties to the matching index. Requirements get ranked
+    matching offers; offers are pushed onto the requirements they satisfy
+    (unless record is False: write-behind saves record them once flushed).
+    Returns {property_id: matches}. Matching never fails a save.
+    """
+    results = {}
+    try:
+        refresh_matcher()
+        pushed = {}
+        for prop in properties:
+            property_id = str(prop['_id'])
+            matcher.add(prop)
+            if prop.get('listing_intent') == 'Requirement':
+                results[property_id] = matcher.match_requirement(prop)
+            else:
+                results[property_id] = matcher.match_offer(prop)
+                for requirement in results[property_id]:
+                    pushed.setdefault(requirement['id'], []).append(property_id)
+        if record:
+            record_matches(pushed)
+    except Exception as e:
+        print(f"Error matching properties: {str(e)}")
+    return results
+
+
+def record_flushed_matches(properties: List[dict]):
+    """Push write-behind offers onto the requirements they satisfy, once in MongoDB"""
+    pushed = {}
+    for prop in properties:
+        if prop.get('listing_intent') != 'Requirement':
+            for requirement in matcher.match_offer(prop):
+                pushed.setdefault(requirement['id'], []).append(str(prop['_id']))
+    record_matches(pushed)
+
+
 class MessageInput(BaseModel):
     message: str
 
 
+class TagChange(BaseModel):
+    add: List[str] = []
+    remove: List[str] = []
+
+
+class BulkFavorite(BaseModel):
+    ids: List[str]
+    is_favorite: bool
+
+
+class BulkTagChange(TagChange):
+    ids: List[str]
+
+
 @app.get("/")
 def read_root():
     return {
@@ -121,18 +368,44 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/api/extract", response_model=PropertyData)
 async def extract_property(message_input: MessageInput):
     """
     Extract property details from WhatsApp message using AI
     """
     try:
+        profiler.annotate(message_input.message)
         extracted_data = extractor.extract_property_details(message_input.message)
+        extracted_data['expires_at'] = listing_expires_at(extracted_data)
         return PropertyData(**extracted_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
 
+@app.post("/api/extract/listings", response_model=List[PropertyData])
+async def extract_listings(message_input: MessageInput, response: Response):
+    """
+    Extract every listing from a message; broker blasts are split into blocks.
+    Blocks beyond the per-message cap are counted in X-Listings-Dropped.
+    """
+    try:
+        profiler.annotate(message_input.message)
+        listings, dropped = extractor.extract_listings(message_input.message)
+        response.headers["X-Listings-Dropped"] = str(dropped)
+        return [PropertyData(**listing, expires_at=listing_expires_at(listing)) for listing in listings]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+
+
 @app.post("/api/properties", response_model=dict)
 async def create_property(property_data: PropertyData):
     """
@@ -142,95 +415,410 @@ async def create_property(property_data: PropertyData):
         property_dict = property_data.model_dump()
         property_dict['is_favorite'] = False
         property_dict['tags'] = []
+        property_dict['expires_at'] = property_dict['expires_at'] or listing_expires_at(property_dict)
         
-        property_id = save_property(property_dict)
+        property_id = save_new_properties([property_dict])[0]
+        bus.publish_local("insert", {"property": property_dict, "stats_delta": stats_delta(None, property_dict)})
+        matches = index_and_match([property_dict], record=not WRITE_BEHIND_ENABLED).get(property_id, [])
         
         return {
             "id": property_id,
-            "message": "Property saved successfully"
+            "message": "Property saved successfully",
+            "queued": WRITE_BEHIND_ENABLED,
+            "listing_intent": property_dict.get('listing_intent'),
+            "matches": matches
         }
     except Exception as e:
         print(f"Error saving property: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to save property: {str(e)}")
 
 
-@app.get("/api/properties", response_model=List[dict])
+@app.post("/api/properties/bulk", response_model=dict)
+async def create_properties_bulk(properties: List[PropertyData]):
+    """
+    Save many properties to MongoDB with a single insert_many
+    """
+    try:
+        property_dicts = []
+        for property_data in properties:
+            property_dict = property_data.model_dump()
+            property_dict['is_favorite'] = False
+            property_dict['tags'] = []
+            property_dict['expires_at'] = property_dict['expires_at'] or listing_expires_at(property_dict)
+            property_dicts.append(property_dict)
+        
+        property_ids = save_new_properties(property_dicts)
+        for property_dict in property_dicts:
+            bus.publish_local("insert", {"property": property_dict, "stats_delta": stats_delta(None, property_dict)})
+        index_and_match(property_dicts, record=not WRITE_BEHIND_ENABLED)
+        
+        return {
+            "ids": property_ids,
+            "count": len(property_ids),
+            "queued": WRITE_BEHIND_ENABLED,
+            "message": f"{len(property_ids)} properties saved successfully"
+        }
+    except Exception as e:
+        print(f"Error saving properties: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to save properties: {str(e)}")
+
+
+def filter_properties(properties: List[dict], property_type: Optional[str] = None,
+                      transaction_type: Optional[str] = None, bhk: Optional[str] = None,
+                      location: Optional[str] = None, search: Optional[str] = None) -> List[dict]:
+    """Apply the list endpoint's filters to property documents"""
+    if property_type:
+        properties = [p for p in properties if p.get('property_type') == property_type]
+    
+    if transaction_type:
+        properties = [p for p in properties if p.get('transaction_type') == transaction_type]
+    
+    if bhk:
+        properties = [p for p in properties if p.get('bhk') == bhk]
+    
+    if location:
+        properties = [p for p in properties 
+                      if location.lower() in str(p.get('location', '')).lower()]
+    
+    if search:
+        search_lower = search.lower()
+        properties = [
+            p for p in properties
+            if search_lower in str(p.get('raw_message', '')).lower() or
+               search_lower in str(p.get('contact_number', '')).lower()
+        ]
+    
+    return properties
+
+
+@app.get("/api/properties")
 async def get_properties_list(
+    request: Request,
+    response: Response,
     property_type: Optional[str] = Query(None),
     transaction_type: Optional[str] = Query(None),
     bhk: Optional[str] = Query(None),
     location: Optional[str] = Query(None),
-    search: Optional[str] = Query(None)
+    search: Optional[str] = Query(None),
+    near: Optional[str] = Query(None, description="Locality name or 'lat,lon'"),
+    radius_km: float = Query(2.0, gt=0, le=50),
+    updated_since: Optional[str] = Query(None, description="server_time of a previous delta response"),
+    archived: bool = Query(False, description="List expired (archived) listings instead")
 ):
     """
-    Get all properties from MongoDB with optional filters
+    Get all live properties from MongoDB with optional filters.
+    With `archived=true`, the most recently archived (expired) listings are listed.
+    With `near`, only properties within radius_km are returned, nearest first.
+    With `updated_since`, only changes are returned: {changed, deleted, server_time}.
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
     """
     try:
-        properties = get_all_properties()
-        
-        # Apply filters
-        if property_type:
-            properties = [p for p in properties if p.get('property_type') == property_type]
+        etag = collection_etag(request.url.query)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"  # Browsers revalidate with If-None-Match
         
-        if transaction_type:
-            properties = [p for p in properties if p.get('transaction_type') == transaction_type]
+        filters = dict(property_type=property_type, transaction_type=transaction_type,
+                       bhk=bhk, location=location, search=search)
         
-        if bhk:
-            properties = [p for p in properties if p.get('bhk') == bhk]
+        if updated_since:
+            if near or archived:
+                raise HTTPException(status_code=400, detail="updated_since cannot be combined with near or archived")
+            return properties_delta(parse_sync_time(updated_since), filters)
         
-        if location:
-            properties = [p for p in properties 
-                          if location.lower() in str(p.get('location', '')).lower()]
+        if archived:
+            if near:
+                raise HTTPException(status_code=400, detail="near cannot be combined with archived")
+            properties = get_archived_properties()
+        elif near:
+            point = resolve_point(near)
+            if point is None:
+                raise HTTPException(status_code=400, detail=f"Unknown location: {near}")
+            
+            # Push exact-match filters into $geoNear so the limit applies after them
+            geo_query = {
+                field: value for field, value in (
+                    ('property_type', property_type),
+                    ('transaction_type', transaction_type),
+                    ('bhk', bhk),
+                ) if value
+            }
+            properties = find_properties_near(point[0], point[1], radius_km, geo_query)
+        else:
+            properties = get_all_properties()
         
-        if search:
-            search_lower = search.lower()
-            properties = [
-                p for p in properties
-                if search_lower in str(p.get('raw_message', '')).lower() or
-                   search_lower in str(p.get('contact_number', '')).lower()
-            ]
+        # Apply filters
+        properties = filter_properties(properties, **filters)
         
         # Convert all ObjectIds to strings and add id field from _id
         properties = [convert_objectid(p) for p in properties]
         
         return properties
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def parse_sync_time(value: str) -> str:
+    """
+    Validate an updated_since value and normalise it to the server's naive
+    ISO format, which is what updated_at and deleted_at are compared against
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="updated_since must be an ISO timestamp (server_time)")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def properties_delta(updated_since: str, filters: dict) -> dict:
+    """
+    Changes since a previous sync. Changed properties that no longer match the
+    filters are reported as deleted so a filtered view stays correct. Clients
+    older than the tombstone retention must do a full refetch.
+    """
+    server_time = (datetime.now() - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+    retention_start = (datetime.now() - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat()
+    if updated_since < retention_start:
+        return {"full_resync": True, "changed": [], "deleted": [], "server_time": server_time}
+    
+    changed = get_properties_changed_since(updated_since, DELTA_SYNC_LIMIT)
+    if len(changed) >= DELTA_SYNC_LIMIT:
+        return {"full_resync": True, "changed": [], "deleted": [], "server_time": server_time}
+    
+    matching = filter_properties(changed, **filters)
+    matching_ids = {str(p['_id']) for p in matching}
+    deleted = get_deleted_since(updated_since)
+    deleted += [str(p['_id']) for p in changed if str(p['_id']) not in matching_ids]
+    
+    return {
+        "full_resync": False,
+        "changed": [convert_objectid(p) for p in matching],
+        "deleted": deleted,
+        "server_time": server_time
+    }
+
+
+@app.get("/api/properties/facets")
+async def get_property_facets(
+    property_type: Optional[str] = Query(None),
+    transaction_type: Optional[str] = Query(None),
+    bhk: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    listing_intent: Optional[str] = Query(None),
+    furnishing: Optional[str] = Query(None),
+    favorites: Optional[bool] = Query(None),
+    price_min: Optional[float] = Query(None, ge=0),
+    price_max: Optional[float] = Query(None, ge=0),
+    carpet_min: Optional[float] = Query(None, ge=0),
+    carpet_max: Optional[float] = Query(None, ge=0),
+    limit: int = Query(50, ge=0, le=500)
+):
+    """
+    Faceted filtering: matching count, newest matching ids and, for every
+    facet field, counts per value under all the other filters.
+    Served from the in-process columnar snapshot when FACET_SNAPSHOT_ENABLED,
+    otherwise from a MongoDB $facet aggregation.
+    """
+    try:
+        values = dict(property_type=property_type, transaction_type=transaction_type, bhk=bhk,
+                      region=region, listing_intent=listing_intent, furnishing=furnishing)
+        equals = {field: value for field, value in values.items() if value}
+        
+        if FACET_SNAPSHOT_ENABLED:
+            refresh_snapshot()
+            if snapshot.is_loaded():
+                result = snapshot.query(equals, favorites, price_min, price_max, carpet_min, carpet_max, limit)
+                return {**result, "source": "snapshot"}
+        
+        if carpet_min is not None or carpet_max is not None:
+            if FACET_SNAPSHOT_ENABLED:
+                # First build still running; the database has no carpet area numbers
+                raise HTTPException(status_code=503, detail="Facet snapshot is loading",
+                                    headers={"Retry-After": "5"})
+            raise HTTPException(status_code=400,
+                                detail="Carpet area ranges need FACET_SNAPSHOT_ENABLED=true")
+        
+        base_query = {}
+        if favorites is not None:
+            base_query["is_favorite"] = True if favorites else {"$ne": True}
+        price = {op: value for op, value in (("$gte", price_min), ("$lte", price_max)) if value is not None}
+        if price:
+            base_query["price_value"] = price
+        equals = {field: None if value == UNKNOWN else value for field, value in equals.items()}
+        
+        result = facet_counts(base_query, equals, FACET_FIELDS, limit)
+        return {**result, "source": "database"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/properties/stream")
+async def stream_properties(request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events feed of inserts, updates, deletes and stat deltas.
+    Reconnecting clients resume from Last-Event-ID; a "resync" event means the
+    client should refetch the list and stats.
+    """
+    return StreamingResponse(
+        event_stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/api/properties/{property_id}", response_model=dict)
 async def get_property_by_id(property_id: str):
     """
-    Get a specific property by ID from MongoDB
+    Get a specific property by ID from MongoDB; expired listings are served
+    from the archive with archived: true, and listings still in the
+    write-behind journal with queued: true
     """
     try:
-        prop = get_property(property_id)
+        db_error = None
+        try:
+            prop = get_property(property_id)
+        except Exception as e:
+            # Queued listings are still served while MongoDB is down
+            prop, db_error = None, e
+        if not prop and WRITE_BEHIND_ENABLED:
+            prop = get_writer().journal.get(property_id)
+            if prop:
+                prop['queued'] = True
         if not prop:
-            raise HTTPException(status_code=404, detail="Property not found")
+            if db_error is not None:
+                raise HTTPException(status_code=503, detail=str(db_error))
+            prop = get_archived_property(property_id)
+            if not prop:
+                raise HTTPException(status_code=404, detail="Property not found")
+            prop['archived'] = True
         
         prop = convert_objectid(prop)
         return prop
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=404, detail="Property not found")
 
 
+@app.post("/api/properties/{property_id}/renew")
+async def renew_property(property_id: str):
+    """
+    Extend a listing's expiry by its TTL from now (the broker confirmed it is
+    still available). Archived listings are restored to the live set.
+    """
+    try:
+        prop = get_property(property_id)
+        if prop:
+            fields = {"expires_at": listing_expires_at(prop)}
+            before = update_property_fields(property_id, fields)
+            if before is None:
+                raise HTTPException(status_code=404, detail="Property not found")
+            updated = {**before, **fields}
+            publish_update(property_id, before, updated)
+            return {"id": property_id, "expires_at": fields["expires_at"], "restored": False}
+        
+        archived = get_archived_property(property_id)
+        if not archived:
+            raise HTTPException(status_code=404, detail="Property not found")
+        restored = restore_archived_property(property_id, {"expires_at": listing_expires_at(archived)})
+        if restored is None:
+            raise HTTPException(status_code=404, detail="Property not found")
+        bus.publish_local("insert", {"property": restored, "stats_delta": stats_delta(None, restored)})
+        index_and_match([restored])
+        if restored.get("image_hash"):
+            image_index.add(property_id, restored["image_hash"])
+        return {"id": property_id, "expires_at": restored["expires_at"], "restored": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/properties/{property_id}/matches")
+async def get_property_matches(property_id: str, limit: int = Query(10, ge=1, le=100)):
+    """
+    Ranked matches for a property: offers for a requirement, or the stored
+    requirements an offer satisfies
+    """
+    try:
+        prop = get_property(property_id)
+        if not prop:
+            raise HTTPException(status_code=404, detail="Property not found")
+        
+        refresh_matcher()
+        if prop.get('listing_intent') == 'Requirement':
+            matches = matcher.match_requirement(prop, limit)
+        else:
+            matches = matcher.match_offer(prop, limit)
+        
+        return {
+            "id": property_id,
+            "listing_intent": prop.get('listing_intent', 'Offer'),
+            "matches": matches
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def derived_fields(current: dict, fields: dict) -> dict:
+    """
+    Fields computed at extraction time (price_value, geo, region, expires_at)
+    that an edit to their source fields makes stale, recomputed from the
+    edited listing
+    """
+    merged = {**current, **fields}
+    
+    def changed(*names):
+        return any(name in fields and fields[name] != current.get(name) for name in names)
+    
+    derived = {}
+    if changed('price'):
+        derived['price_value'] = extractor.parse_price_value(merged.get('price'))
+    if changed('area', 'location'):
+        derived['geo'] = locality_point(merged.get('area'))
+        derived['region'] = extractor.region_for_area(merged.get('area'))
+    if changed(*EXPIRY_SOURCE_FIELDS):
+        # Counted from when the listing was saved, so an edit is not a renewal
+        derived['expires_at'] = saved_listing_expires_at(merged)
+    return derived
+
+
 @app.put("/api/properties/{property_id}", response_model=dict)
 async def update_property_handler(property_id: str, property_data: PropertyData):
     """
     Update a property in MongoDB
     """
     try:
-        update_count = update_property(property_id, {
-            **property_data.model_dump(exclude_unset=True),
-            "updated_at": datetime.now().isoformat()
-        })
+        fields = property_data.model_dump(exclude_unset=True)
+        current = get_property(property_id)
+        if current is None:
+            raise HTTPException(status_code=404, detail="Property not found")
+        derived = derived_fields(current, fields)
+        fields.update(derived)
+        # Hand corrections are recorded so re-extraction never overwrites them
+        # (recomputed fields follow their sources instead)
+        tracked = [field for field in EDITABLE_FIELDS if field not in derived]
+        before = update_property_fields(property_id, fields, track_edits=tracked)
         
-        if update_count == 0:
+        if before is None:
             raise HTTPException(status_code=404, detail="Property not found")
         
-        updated = get_property(property_id)
-        updated['id'] = str(updated.get('_id', ''))
-        return updated
+        updated = {**before, **fields}
+        publish_update(property_id, before, updated)
+        # Safe during a rebuild: the change is replayed onto the new index
+        matcher.add(updated)
+        return convert_objectid(updated)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -241,12 +829,51 @@ async def delete_property_handler(property_id: str):
     Delete a property from MongoDB
     """
     try:
-        delete_count = delete_property(property_id)
+        deleted = pop_property(property_id)
         
-        if delete_count == 0:
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Property not found")
         
+        bus.publish_local("delete", {"id": property_id, "stats_delta": stats_delta(deleted, None)})
+        matcher.remove(property_id)
+        image_index.remove(property_id)
         return {"message": "Property deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/properties/bulk/favorite")
+async def bulk_update_favorite(change: BulkFavorite):
+    """
+    Set favorite status on many properties with one update_many
+    """
+    try:
+        matched = bulk_set_favorite(change.ids, change.is_favorite)
+        bus.publish_local("bulk_update", {
+            "ids": change.ids,
+            "fields": {"is_favorite": change.is_favorite},
+            "resync_stats": True
+        })
+        return {"message": "Favorite status updated", "matched": matched, "is_favorite": change.is_favorite}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/properties/bulk/tags")
+async def bulk_update_tags(change: BulkTagChange):
+    """
+    Add and/or remove tags on many properties with one update_many
+    """
+    try:
+        matched = bulk_modify_tags(change.ids, change.add, change.remove)
+        bus.publish_local("bulk_update", {
+            "ids": change.ids,
+            "tags_added": change.add,
+            "tags_removed": change.remove
+        })
+        return {"message": "Tags updated", "matched": matched}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -254,17 +881,17 @@ async def delete_property_handler(property_id: str):
 @app.patch("/api/properties/{property_id}/favorite")
 async def toggle_favorite(property_id: str):
     """
-    Toggle favorite status in MongoDB
+    Toggle favorite status atomically in MongoDB
     """
     try:
-        prop = get_property(property_id)
+        prop = toggle_favorite_status(property_id)
         if not prop:
             raise HTTPException(status_code=404, detail="Property not found")
         
-        new_favorite_status = not prop.get('is_favorite', False)
-        update_property(property_id, {'is_favorite': new_favorite_status})
-        
-        return {"message": "Favorite status updated", "is_favorite": new_favorite_status}
+        publish_update(property_id, {**prop, 'is_favorite': not prop['is_favorite']}, prop)
+        return {"message": "Favorite status updated", "is_favorite": prop['is_favorite']}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -272,26 +899,51 @@ async def toggle_favorite(property_id: str):
 @app.patch("/api/properties/{property_id}/tags")
 async def update_tags(property_id: str, tags: List[str]):
     """
-    Update property tags in MongoDB
+    Replace property tags in MongoDB
     """
     try:
-        prop = get_property(property_id)
+        prop = set_tags(property_id, tags)
         if not prop:
             raise HTTPException(status_code=404, detail="Property not found")
         
-        update_property(property_id, {'tags': tags})
+        publish_update(property_id, prop, prop)
+        return {"message": "Tags updated", "tags": prop['tags']}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/properties/{property_id}/tags")
+async def change_tags(property_id: str, change: TagChange):
+    """
+    Add and/or remove individual tags without rewriting the whole list
+    """
+    try:
+        prop = modify_tags(property_id, change.add, change.remove)
+        if not prop:
+            raise HTTPException(status_code=404, detail="Property not found")
         
-        return {"message": "Tags updated", "tags": tags}
+        publish_update(property_id, prop, prop)
+        return {"message": "Tags updated", "tags": prop.get('tags', [])}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/stats")
-async def get_statistics():
+async def get_statistics(request: Request, response: Response):
     """
-    Get database statistics from MongoDB
+    Get database statistics from MongoDB (ETag / If-None-Match aware)
     """
     try:
+        etag = collection_etag("stats")
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"  # Browsers revalidate with If-None-Match
+        
         properties = get_all_properties()
         total = len(properties)
         
@@ -350,18 +1002,29 @@ async def upload_image(property_id: str, file: UploadFile = File(...)):
             raise HTTPException(status_code=500, detail=result["error"])
         
         # Update property with image info
-        update_property(property_id, {
+        image_fields = {
             "image_id": result["file_id"],
             "image_filename": result["filename"],
-            "image_size": result["size"]
-        })
+            "image_size": result["size"],
+            "image_hash": result["image_hash"]
+        }
+        update_property(property_id, image_fields)
+        publish_update(property_id, prop, {**prop, **image_fields})
+        
+        # Listings already using the same photos are likely reposts
+        similar = []
+        if result["image_hash"]:
+            refresh_image_index()
+            image_index.add(property_id, result["image_hash"])
+            similar = image_index.similar(result["image_hash"], exclude=property_id)
         
         return {
             "success": True,
             "file_id": result["file_id"],
             "filename": result["filename"],
             "image_url": f"/uploads/{result['file_id']}.jpg",
-            "thumbnail_url": f"/uploads/{result['file_id']}_thumb.jpg"
+            "thumbnail_url": f"/uploads/{result['file_id']}_thumb.jpg",
+            "similar_listings": similar
         }
     except HTTPException:
         raise
@@ -423,11 +1086,15 @@ async def delete_property_image(property_id: str):
         delete_image(file_id)
         
         # Remove image info from property
-        update_property(property_id, {
+        image_fields = {
             "image_id": None,
             "image_filename": None,
-            "image_size": None
-        })
+            "image_size": None,
+            "image_hash": None
+        }
+        update_property(property_id, image_fields)
+        publish_update(property_id, prop, {**prop, **image_fields})
+        image_index.remove(property_id)
         
         return {"message": "Image deleted successfully"}
     except HTTPException:
@@ -436,6 +1103,65 @@ async def delete_property_image(property_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/property-images/{property_id}/similar")
+async def get_similar_listings(property_id: str,
+                               max_distance: int = Query(DUPLICATE_MAX_DISTANCE, ge=0, le=16)):
+    """
+    Listings whose photo is a near-duplicate of this property's photo
+    (Hamming distance between perceptual hashes, out of 64 bits)
+    """
+    try:
+        prop = get_property(property_id)
+        if not prop:
+            raise HTTPException(status_code=404, detail="Property not found")
+        
+        if not prop.get("image_hash"):
+            raise HTTPException(status_code=404, detail="No image hash for this property")
+        
+        refresh_image_index()
+        similar = image_index.similar(prop["image_hash"], max_distance, exclude=property_id)
+        
+        # Attach the listings themselves, keeping closest-first order
+        found = get_properties_by_ids([s["id"] for s in similar]) if similar else {}
+        
+        return {
+            "id": property_id,
+            "image_hash": prop["image_hash"],
+            "similar_listings": [
+                {**convert_objectid(found[s["id"]]), "photo_distance": s["distance"]}
+                for s in similar if s["id"] in found
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ==================== ADMIN ENDPOINTS ====================
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    List captured slow-request profiles, newest first
+    """
+    return {
+        "enabled": profiler.PROFILING_ENABLED,
+        "threshold_ms": profiler.profiler.threshold_ms,
+        "profiles": profiler.profiler.list_profiles()
+    }
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)],
+         response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """
+    Download a profile as folded stacks (flamegraph.pl / speedscope compatible)
+    """
+    folded = profiler.profiler.get_folded(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return folded
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,256 @@
+"""
+Requirement Matching Module
+Matches requirements (brokers' clients looking for a flat) against inventory
+(offers) and the other way round.
+
+Both sides are indexed by (transaction type, BHK) -> area or region -> price
+band, so a lookup only touches listings in compatible buckets instead of
+scanning every requirement/offer pair.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# An offer matches a budget if its price is within [budget * LOW, budget * HIGH]
+BUDGET_LOW_RATIO = 0.5
+BUDGET_HIGH_RATIO = 1.1
+
+# Price bands are logarithmic: each band spans a 25% price step
+PRICE_BAND_STEP = math.log(1.25)
+
+# Rebuild the in-process index from MongoDB at this interval, so writes made
+# by other workers are picked up
+MATCH_INDEX_REFRESH_SECONDS = 300
+
+NO_PRICE_BAND = None
+
+
+def price_band(price_value: Optional[float]):
+    """Logarithmic price band of a rupee amount"""
+    if not price_value or price_value <= 0:
+        return NO_PRICE_BAND
+    return int(math.log(price_value) / PRICE_BAND_STEP)
+
+
+def _entry(doc: Dict) -> Dict:
+    """Fields of a property document used for matching"""
+    return {
+        'id': str(doc.get('_id') or doc.get('id')),
+        'transaction_type': doc.get('transaction_type'),
+        'bhk': doc.get('bhk'),
+        'area': doc.get('area') or doc.get('location'),
+        'region': doc.get('region'),
+        'price_value': doc.get('price_value'),
+        'created_at': doc.get('created_at', ''),
+    }
+
+
+def _places(entry: Dict) -> List[str]:
+    """Bucket keys for where a listing is: its area and its railway-line region"""
+    places = []
+    if entry['area']:
+        places.append('area:' + entry['area'].lower())
+    if entry['region']:
+        places.append('region:' + entry['region'].lower())
+    return places
+
+
+class ListingIndex:
+    """Listings bucketed by (transaction, BHK), then area/region, then price band"""
+
+    def __init__(self):
+        # (transaction, bhk) -> 'area:<name>' | 'region:<name>' -> band -> {id: entry}
+        self._buckets: Dict[tuple, Dict[str, Dict[Optional[int], Dict[str, Dict]]]] = {}
+        self._entries: Dict[str, Dict] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry: Dict):
+        self.remove(entry['id'])
+        key = (entry['transaction_type'], entry['bhk'])
+        band = price_band(entry['price_value'])
+        for place in _places(entry):
+            self._buckets.setdefault(key, {}).setdefault(place, {}).setdefault(band, {})[entry['id']] = entry
+        self._entries[entry['id']] = entry
+
+    def remove(self, listing_id: str):
+        entry = self._entries.pop(listing_id, None)
+        if entry is None:
+            return
+        places = self._buckets.get((entry['transaction_type'], entry['bhk']), {})
+        band = price_band(entry['price_value'])
+        for place in _places(entry):
+            places.get(place, {}).get(band, {}).pop(listing_id, None)
+
+    def candidates(self, transaction_type: Optional[str], bhk: Optional[str],
+                   places: List[str], bands: Optional[range]) -> Iterable[Dict]:
+        """
+        Yield listings in compatible buckets. A missing transaction type or BHK
+        on either side acts as a wildcard; bands=None means any price.
+        """
+        seen = set()
+        for (key_transaction, key_bhk), by_place in self._buckets.items():
+            if transaction_type and key_transaction and key_transaction != transaction_type:
+                continue
+            if bhk and key_bhk and key_bhk != bhk:
+                continue
+            for place in places:
+                by_band = by_place.get(place)
+                if not by_band:
+                    continue
+                wanted = by_band.keys() if bands is None else [*bands, NO_PRICE_BAND]
+                for band in wanted:
+                    for listing_id, entry in by_band.get(band, {}).items():
+                        if listing_id not in seen:
+                            seen.add(listing_id)
+                            yield entry
+
+
+class MatchingEngine:
+    """Keeps offer and requirement indexes and ranks matches between them"""
+
+    def __init__(self, refresh_seconds: float = MATCH_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.offers = ListingIndex()
+        self.requirements = ListingIndex()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # Changes made while a rebuild is running, replayed onto the new indexes
+        self._pending: Optional[List[tuple]] = None
+        self._refreshing = False
+
+    def load(self, documents: Iterable[Dict]):
+        """(Re)build both indexes from property documents"""
+        with self._lock:
+            self._pending = []
+        offers, requirements = ListingIndex(), ListingIndex()
+        try:
+            for doc in documents:
+                target = requirements if doc.get('listing_intent') == 'Requirement' else offers
+                target.add(_entry(doc))
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for change, arg in self._pending:
+                if change == 'add':
+                    self._add(offers, requirements, arg)
+                else:
+                    offers.remove(arg)
+                    requirements.remove(arg)
+            self._pending = None
+            self.offers, self.requirements = offers, requirements
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def refresh_in_background(self, fetch_documents: Callable[[], Iterable[Dict]]) -> bool:
+        """
+        Rebuild in a background thread if the index is stale and no rebuild is
+        running; requests keep using the current indexes until the swap.
+        Returns True if a rebuild was started.
+        """
+        with self._lock:
+            if self._refreshing or not self.is_stale():
+                return False
+            self._refreshing = True
+
+        def rebuild():
+            try:
+                self.load(fetch_documents())
+            except Exception as e:
+                print(f"Matching index rebuild failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=rebuild, name="matching-rebuild", daemon=True).start()
+        return True
+
+    @staticmethod
+    def _add(offers: ListingIndex, requirements: ListingIndex, doc: Dict):
+        entry = _entry(doc)
+        offers.remove(entry['id'])
+        requirements.remove(entry['id'])
+        target = requirements if doc.get('listing_intent') == 'Requirement' else offers
+        target.add(entry)
+
+    def add(self, doc: Dict):
+        with self._lock:
+            self._add(self.offers, self.requirements, doc)
+            if self._pending is not None:
+                self._pending.append(('add', doc))
+
+    def remove(self, listing_id: str):
+        with self._lock:
+            self.offers.remove(listing_id)
+            self.requirements.remove(listing_id)
+            if self._pending is not None:
+                self._pending.append(('remove', listing_id))
+
+    def match_requirement(self, doc: Dict, limit: int = 10) -> List[Dict]:
+        """Ranked offers for a requirement"""
+        requirement = _entry(doc)
+        budget = requirement['price_value']
+        bands = None
+        if budget:
+            bands = range(price_band(budget * BUDGET_LOW_RATIO), price_band(budget * BUDGET_HIGH_RATIO) + 1)
+        with self._lock:
+            candidates = self.offers.candidates(
+                requirement['transaction_type'], requirement['bhk'], _places(requirement), bands
+            )
+            return self._rank(requirement, candidates, limit, subject_is_requirement=True)
+
+    def match_offer(self, doc: Dict, limit: int = 10) -> List[Dict]:
+        """Ranked stored requirements an offer satisfies"""
+        offer = _entry(doc)
+        price = offer['price_value']
+        bands = None
+        if price:
+            bands = range(price_band(price / BUDGET_HIGH_RATIO), price_band(price / BUDGET_LOW_RATIO) + 1)
+        with self._lock:
+            candidates = self.requirements.candidates(
+                offer['transaction_type'], offer['bhk'], _places(offer), bands
+            )
+            return self._rank(offer, candidates, limit, subject_is_requirement=False)
+
+    def _rank(self, subject: Dict, candidates: Iterable[Dict], limit: int,
+              subject_is_requirement: bool) -> List[Dict]:
+        scored = []
+        for candidate in candidates:
+            if candidate['id'] == subject['id']:
+                continue
+            requirement, offer = (subject, candidate) if subject_is_requirement else (candidate, subject)
+            score = self._score(subject, candidate, requirement['price_value'], offer['price_value'])
+            if score is not None:
+                scored.append({**candidate, 'match_score': score})
+        scored.sort(key=lambda m: (m['match_score'], m['created_at']), reverse=True)
+        return scored[:limit]
+
+    @staticmethod
+    def _score(subject: Dict, candidate: Dict, budget: Optional[float],
+               price: Optional[float]) -> Optional[float]:
+        """Score in [0, 1]; None when the price is outside the budget window"""
+        score = 0.0
+        if subject['area'] and candidate['area'] and subject['area'].lower() == candidate['area'].lower():
+            score += 0.4
+        elif subject['region'] and candidate['region'] == subject['region']:
+            score += 0.15
+        if subject['bhk'] and candidate['bhk'] == subject['bhk']:
+            score += 0.2
+        if subject['transaction_type'] and candidate['transaction_type'] == subject['transaction_type']:
+            score += 0.1
+        if budget and price:
+            if not budget * BUDGET_LOW_RATIO <= price <= budget * BUDGET_HIGH_RATIO:
+                return None
+            # Closer to the budget ranks higher
+            score += 0.3 * (1 - min(abs(budget - price) / budget, 1))
+        return round(score, 3)
+
+
+matcher = MatchingEngine()
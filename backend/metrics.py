@@ -0,0 +1,193 @@
+"""
+Metrics Module
+Prometheus instrumentation for the API, the extractor, MongoDB calls and the
+image pipeline. Everything here is cheap enough to stay enabled in production.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+
+# Buckets tuned for in-process work (extraction stages, image resizing)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method"],
+)
+
+EXTRACTION_STAGE_DURATION = Histogram(
+    "extraction_stage_duration_seconds",
+    "Time spent in each PropertyExtractor stage",
+    ["stage"],
+    buckets=FAST_BUCKETS,
+)
+
+DB_OPERATION_DURATION = Histogram(
+    "db_operation_duration_seconds",
+    "MongoDB call latency by operation",
+    ["operation"],
+)
+
+DB_OPERATIONS = Counter(
+    "db_operations_total",
+    "MongoDB calls by operation and outcome",
+    ["operation", "outcome"],
+)
+
+IMAGE_STAGE_DURATION = Histogram(
+    "image_stage_duration_seconds",
+    "Time spent in each image pipeline stage",
+    ["stage"],
+    buckets=FAST_BUCKETS,
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Requests rejected by admission control",
+    ["route", "reason"],
+)
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Time admitted requests waited for a concurrency slot",
+    ["route"],
+    buckets=FAST_BUCKETS,
+)
+
+WRITE_BEHIND_PENDING = Gauge(
+    "write_behind_pending",
+    "Listings journaled but not yet written to MongoDB",
+)
+
+WRITE_BEHIND_DEAD_LETTERS = Counter(
+    "write_behind_dead_letters_total",
+    "Journaled listings MongoDB rejected, moved to the dead-letter table",
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the duration of the wrapped block on a labelled histogram"""
+    child = histogram.labels(**labels)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        child.observe(time.perf_counter() - start)
+
+
+def track_db(operation: str):
+    """Decorator recording latency and outcome of a database helper"""
+    duration = DB_OPERATION_DURATION.labels(operation=operation)
+    ok = DB_OPERATIONS.labels(operation=operation, outcome="ok")
+    error = DB_OPERATIONS.labels(operation=operation, outcome="error")
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                error.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+            ok.inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def track_image_stage(stage: str):
+    """Decorator recording how long an image pipeline stage takes"""
+    duration = IMAGE_STAGE_DURATION.labels(stage=stage)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+_route_paths = None
+
+
+def route_template(scope) -> str:
+    """
+    Return the path template of the route that served an ASGI request
+    (e.g. /api/properties/{property_id}) so that label cardinality stays bounded.
+    """
+    global _route_paths
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if _route_paths is None:
+        routes = getattr(scope.get("app"), "routes", [])
+        _route_paths = {
+            getattr(route, "endpoint", None): route.path for route in routes
+        }
+    return _route_paths.get(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        # The route template is only known after routing, so in-flight
+        # requests are tracked per method.
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method=method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(
+                method=method,
+                route=route_template(scope),
+                status=str(status["code"]),
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,189 @@
+"""
+Sampling Profiler Module
+Opt-in middleware that samples the stack of in-flight requests and keeps a
+flamegraph-compatible (folded stacks) profile of every request slower than a
+latency threshold. When PROFILING_ENABLED is off the middleware is never
+installed and annotate() is a single context variable lookup.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import route_template
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+PROFILE_MESSAGE_CHARS = 80
+PROFILE_MAX_DEPTH = 64
+
+# Long-lived streams would keep the sampler busy for their whole lifetime
+UNPROFILED_PATHS = {"/api/properties/stream"}
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def anonymize_message(message: str, max_chars: int = PROFILE_MESSAGE_CHARS) -> str:
+    """Truncate a message and mask digits so phone numbers never reach a profile"""
+    snippet = " ".join(message.split())[:max_chars]
+    return re.sub(r"\d", "#", snippet)
+
+
+class ProfileSession:
+    """Samples collected for one in-flight request"""
+
+    def __init__(self, method: str, path: str, thread_id: int):
+        self.method = method
+        self.path = path
+        self.thread_id = thread_id
+        self.message: Optional[str] = None
+        self.stacks: Counter = Counter()
+        self.started = time.perf_counter()
+
+
+def annotate(message: str):
+    """Attach an anonymized copy of the request's message to the current profile"""
+    session = _current_session.get()
+    if session is not None:
+        session.message = anonymize_message(message)
+
+
+def _fold_stack(frame) -> str:
+    """Render a frame chain as a folded stack line, outermost frame first"""
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Background sampler plus a bounded store of slow-request profiles.
+
+    Samples are taken from the thread that entered the middleware. Request
+    handlers here are async and run their blocking work on the event loop
+    thread, so concurrent requests on that thread share samples; the profile of
+    a slow request is still dominated by the work that made it slow.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS,
+                 threshold_ms: float = PROFILE_THRESHOLD_MS,
+                 max_stored: int = PROFILE_MAX_STORED):
+        self.interval = interval_ms / 1000.0
+        self.threshold_ms = threshold_ms
+        self.profiles = deque(maxlen=max_stored)
+        self._sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="request-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._wakeup.clear()
+                    continue
+            frames = sys._current_frames()
+            folded: Dict[int, str] = {}
+            for session in sessions:
+                frame = frames.get(session.thread_id)
+                if frame is None:
+                    continue
+                if session.thread_id not in folded:
+                    folded[session.thread_id] = _fold_stack(frame)
+                session.stacks[folded[session.thread_id]] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def start(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.append(session)
+            self._ensure_thread()
+            self._wakeup.set()
+
+    def finish(self, session: ProfileSession, route: str):
+        with self._lock:
+            self._sessions.remove(session)
+
+        duration_ms = (time.perf_counter() - session.started) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        self.profiles.append({
+            "id": uuid.uuid4().hex[:12],
+            "route": route,
+            "method": session.method,
+            "duration_ms": round(duration_ms, 2),
+            "samples": sum(session.stacks.values()),
+            "message": session.message,
+            "captured_at": datetime.now().isoformat(),
+            "stacks": dict(session.stacks),
+        })
+
+    def list_profiles(self) -> List[Dict]:
+        """Summaries of stored profiles, newest first"""
+        return [
+            {k: v for k, v in profile.items() if k != "stacks"}
+            for profile in reversed(self.profiles)
+        ]
+
+    def get_folded(self, profile_id: str) -> Optional[str]:
+        """Folded stacks ("frame;frame;frame count" per line) for flamegraph.pl/speedscope"""
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return "\n".join(
+                    f"{stack} {count}" for stack, count in profile["stacks"].items()
+                ) + "\n"
+        return None
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles each HTTP request while it is in flight"""
+
+    def __init__(self, app, sampler: SamplingProfiler = profiler):
+        self.app = app
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNPROFILED_PATHS \
+                or scope["path"].startswith("/admin/profiles"):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(scope["method"], scope["path"], threading.get_ident())
+        token = _current_session.set(session)
+        self.sampler.start(session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_session.reset(token)
+            self.sampler.finish(session, route_template(scope))
@@ -0,0 +1,182 @@
+"""
+Re-extraction Job
+Re-runs the extractor over stored listings whose extractor_version is stale
+(after property_patterns, transaction_patterns, mumbai_areas or the price
+regexes change) and writes changed fields back in bulk.
+
+The job streams raw_message in _id order, extracts batches in parallel worker
+processes and checkpoints the last written _id after every bulk write, so it
+can be interrupted at any time and resumed by running it again.
+
+Usage:
+    python reextract.py [--batch-size 500] [--workers 4] [--checkpoint path] [--restart]
+"""
+
+import argparse
+import json
+import os
+import signal
+from datetime import datetime
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+
+from bson.objectid import ObjectId
+
+from ai_extractor import DERIVED_FROM, EXTRACTED_FIELDS, extractor
+from database import bulk_update_properties, connect, iter_stale_properties
+from lifecycle import EXPIRY_SOURCE_FIELDS, saved_listing_expires_at
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(__file__), "reextract_checkpoint.json")
+
+
+def load_checkpoint(path: str, version: str) -> Dict:
+    """Load the checkpoint for this extractor version, or start a fresh one"""
+    fresh = {"version": version, "last_id": None, "processed": 0, "updated": 0, "partial": 0}
+    if not os.path.exists(path):
+        return fresh
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable checkpoint: {str(e)}")
+        return fresh
+    return checkpoint if checkpoint.get("version") == version else fresh
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Write the checkpoint atomically so an interrupt never leaves it half written"""
+    checkpoint["saved_at"] = datetime.now().isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _protected_fields(doc: Dict) -> set:
+    """
+    Fields corrected by hand or inherited from a blast's preamble (neither is
+    in the listing's own raw_message), plus the fields derived from them
+    """
+    kept = set(doc.get("edited_fields") or []) | set(doc.get("inherited_fields") or [])
+    return kept | {field for field, sources in DERIVED_FROM.items() if kept.intersection(sources)}
+
+
+def reextract_batch(documents: List[Dict]) -> List[Dict]:
+    """
+    Re-extract a batch of documents; runs in a worker process. A result cut
+    short by the time budget is not written (and the listing keeps its old
+    extractor_version), so the next run retries it.
+    """
+    updates = []
+    for doc in documents:
+        fields = {"extractor_version": extractor.version}
+        raw_message = doc.get("raw_message")
+        if raw_message:
+            extracted = extractor.extract_property_details(raw_message)
+            if extracted.get("extraction_partial"):
+                updates.append({"_id": doc["_id"], "fields": None})
+                continue
+            protected = _protected_fields(doc)
+            # A stored value is never replaced by None: a pattern that no longer
+            # matches is not evidence the value is wrong
+            changed = {
+                field: extracted.get(field)
+                for field in EXTRACTED_FIELDS
+                if field not in protected and extracted.get(field) is not None
+                and doc.get(field) != extracted.get(field)
+            }
+            if any(field in changed for field in EXPIRY_SOURCE_FIELDS):
+                changed["expires_at"] = saved_listing_expires_at({**doc, **changed})
+            if changed:
+                fields.update(changed)
+                fields["updated_at"] = datetime.now().isoformat()
+        updates.append({"_id": doc["_id"], "fields": fields})
+    return updates
+
+
+def _batches(cursor, batch_size: int):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker():
+    # Let the parent handle Ctrl+C so the pool can be shut down cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run(batch_size: int = 500, workers: Optional[int] = None,
+        checkpoint_path: str = DEFAULT_CHECKPOINT, restart: bool = False) -> Dict:
+    """Re-extract every stale listing, resuming from the checkpoint"""
+    version = extractor.version
+    checkpoint = load_checkpoint(checkpoint_path, version)
+    if restart:
+        checkpoint = {"version": version, "last_id": None, "processed": 0, "updated": 0, "partial": 0}
+    checkpoint.pop("completed", None)
+
+    after_id = ObjectId(checkpoint["last_id"]) if checkpoint["last_id"] else None
+    print(f"Re-extracting with extractor {version}"
+          + (f", resuming after {after_id}" if after_id else ""))
+
+    cursor = iter_stale_properties(
+        version, after_id, batch_size,
+        EXTRACTED_FIELDS + ["edited_fields", "inherited_fields", "created_at"]
+    )
+    pool = Pool(processes=workers, initializer=_init_worker)
+    try:
+        # imap keeps batch order, so the checkpoint only ever moves forward
+        # past batches that have been fully written
+        for updates in pool.imap(reextract_batch, _batches(cursor, batch_size)):
+            checkpoint["last_id"] = str(updates[-1]["_id"])
+            partial = [u for u in updates if u["fields"] is None]
+            updates = [u for u in updates if u["fields"] is not None]
+            bulk_update_properties(updates)
+            checkpoint["processed"] += len(updates)
+            checkpoint["partial"] = checkpoint.get("partial", 0) + len(partial)
+            checkpoint["updated"] += sum(1 for u in updates if "updated_at" in u["fields"])
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"  processed {checkpoint['processed']}, changed {checkpoint['updated']}")
+        pool.close()
+    except KeyboardInterrupt:
+        print("Interrupted; progress is checkpointed, run again to resume")
+        pool.terminate()
+        raise
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        cursor.close()
+
+    checkpoint["completed"] = True
+    # Listings skipped as partial are still stale; the next run starts over
+    # from the beginning and only finds those
+    checkpoint["last_id"] = None
+    save_checkpoint(checkpoint_path, checkpoint)
+    print(f"✓ Re-extraction complete: {checkpoint['processed']} processed, "
+          f"{checkpoint['updated']} changed")
+    if checkpoint.get("partial"):
+        print(f"  {checkpoint['partial']} hit the time budget and were left for the next run")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract listings with stale extractor versions")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore the existing checkpoint")
+    args = parser.parse_args()
+
+    if connect() is None:
+        raise SystemExit(1)
+
+    try:
+        run(args.batch_size, args.workers, args.checkpoint, args.restart)
+    except KeyboardInterrupt:
+        raise SystemExit(130)
@@ -0,0 +1,351 @@
+"""
+Inventory Snapshot Module
+Optional in-process columnar copy of the listings for faceted filtering.
+
+Each categorical value (and favorite status, and liveness) is a packed bitmap
+with one bit per listing, stored as uint64 words. A filter ANDs a handful of
+bitmaps and a facet count is the popcount of one more AND, so a query over a
+million listings touches ~16K words per bitmap and never a document. Price
+and carpet area are float columns (NaN when unknown) for range filters.
+
+The snapshot is kept current from the live event bus (every insert, update and
+delete, including other workers' writes when change streams are available)
+and rebuilt from MongoDB periodically. numpy is only imported when the first
+snapshot is built, so a server with the snapshot disabled never loads it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FACET_SNAPSHOT_ENABLED = os.getenv("FACET_SNAPSHOT_ENABLED", "false").lower() == "true"
+
+# Fields with facet counts, in response order
+FACET_FIELDS = ('property_type', 'transaction_type', 'bhk', 'region', 'listing_intent', 'furnishing')
+
+# Rebuild from MongoDB at this interval to compact deleted rows and pick up
+# writes missed without change streams
+SNAPSHOT_REFRESH_SECONDS = 600
+
+# Rows are allocated in whole 64-bit words
+INITIAL_CAPACITY = 1024
+UNKNOWN = 'Unknown'
+
+SNAPSHOT_PROJECTION = {
+    **{field: 1 for field in FACET_FIELDS},
+    "is_favorite": 1, "price_value": 1, "carpet_area": 1,
+}
+
+np = None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def carpet_sqft(carpet_area) -> float:
+    """Leading number of a carpet area string ("850 sq ft" -> 850.0), NaN if none"""
+    if isinstance(carpet_area, (int, float)):
+        return float(carpet_area)
+    match = re.search(r'\d[\d,]{0,12}(?:\.\d+)?', str(carpet_area or ''))
+    return float(match.group().replace(',', '')) if match else float('nan')
+
+
+def _bitmap(mask: np.ndarray) -> np.ndarray:
+    """Pack a boolean array (length a multiple of 64) into uint64 words"""
+    return np.packbits(mask, bitorder='little').view(np.uint64)
+
+
+def _popcount(words: np.ndarray) -> int:
+    return int(np.bitwise_count(words).sum())
+
+
+class _Columns:
+    """Bitmaps and numeric columns with spare capacity; row i is listing ids[i]"""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        _load_numpy()
+        self.capacity = capacity
+        self.size = 0
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        # Code 0 is always "unknown"
+        self.values = {field: [None] for field in FACET_FIELDS}
+        self.lookup = {field: {None: 0} for field in FACET_FIELDS}
+        self.codes = {field: np.zeros(capacity, dtype=np.int32) for field in FACET_FIELDS}
+        # field -> (values, words) array; row `code` is the bitmap of values[code]
+        self.bitmaps = {field: self._empty()[np.newaxis, :] for field in FACET_FIELDS}
+        self.alive = self._empty()
+        self.favorite = self._empty()
+        self.price = np.full(capacity, np.nan)
+        self.carpet = np.full(capacity, np.nan)
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros(self.capacity // 64, dtype=np.uint64)
+
+    def _grow(self):
+        extra = self.capacity
+        self.capacity *= 2
+        pad_words = np.zeros(extra // 64, dtype=np.uint64)
+        self.alive = np.concatenate([self.alive, pad_words])
+        self.favorite = np.concatenate([self.favorite, pad_words])
+        for field in FACET_FIELDS:
+            self.codes[field] = np.concatenate([self.codes[field], np.zeros(extra, dtype=np.int32)])
+            self.bitmaps[field] = np.pad(self.bitmaps[field], ((0, 0), (0, len(pad_words))))
+        self.price = np.concatenate([self.price, np.full(extra, np.nan)])
+        self.carpet = np.concatenate([self.carpet, np.full(extra, np.nan)])
+
+    def _encode(self, field: str, value) -> int:
+        code = self.lookup[field].get(value)
+        if code is None:
+            code = self.lookup[field][value] = len(self.values[field])
+            self.values[field].append(value)
+            self.bitmaps[field] = np.vstack([self.bitmaps[field], self._empty()])
+        return code
+
+    @staticmethod
+    def _set(words: np.ndarray, row: int, on: bool):
+        bit = np.uint64(1 << (row & 63))
+        if on:
+            words[row >> 6] |= bit
+        else:
+            words[row >> 6] &= ~bit
+
+    def upsert(self, doc: Dict):
+        listing_id = str(doc.get('_id') or doc.get('id'))
+        row = self.rows.get(listing_id)
+        if row is None:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.rows[listing_id] = self.size
+            self.ids.append(listing_id)
+            self.size += 1
+        self._set(self.alive, row, True)
+        self._set(self.favorite, row, bool(doc.get('is_favorite', False)))
+        self.price[row] = doc.get('price_value') or np.nan
+        self.carpet[row] = carpet_sqft(doc.get('carpet_area'))
+        for field in FACET_FIELDS:
+            code = self._encode(field, doc.get(field))
+            self._set(self.bitmaps[field][self.codes[field][row]], row, False)
+            self._set(self.bitmaps[field][code], row, True)
+            self.codes[field][row] = code
+
+    def remove(self, listing_id: str):
+        # The row stays as a dead slot until the next rebuild
+        row = self.rows.pop(listing_id, None)
+        if row is not None:
+            self._set(self.alive, row, False)
+            self.ids[row] = None
+
+    def set_favorite(self, listing_ids: List[str], is_favorite: bool):
+        for listing_id in listing_ids:
+            if listing_id in self.rows:
+                self._set(self.favorite, self.rows[listing_id], is_favorite)
+
+    @classmethod
+    def build(cls, documents: Iterable[Dict]) -> "_Columns":
+        """Bulk load: encode every document, then pack all bitmaps at once"""
+        columns = cls()
+        favorite = []
+        for doc in documents:
+            listing_id = str(doc.get('_id') or doc.get('id'))
+            if columns.size == columns.capacity:
+                columns.capacity *= 2
+                for field in FACET_FIELDS:
+                    columns.codes[field] = np.resize(columns.codes[field], columns.capacity)
+                columns.price = np.resize(columns.price, columns.capacity)
+                columns.carpet = np.resize(columns.carpet, columns.capacity)
+            row = columns.rows[listing_id] = columns.size
+            columns.ids.append(listing_id)
+            columns.size += 1
+            favorite.append(bool(doc.get('is_favorite', False)))
+            columns.price[row] = doc.get('price_value') or np.nan
+            columns.carpet[row] = carpet_sqft(doc.get('carpet_area'))
+            for field in FACET_FIELDS:
+                columns.codes[field][row] = columns._encode(field, doc.get(field))
+
+        n, capacity = columns.size, columns.capacity
+        columns.codes = {field: codes[:capacity] for field, codes in columns.codes.items()}
+        for field in FACET_FIELDS:
+            columns.codes[field][n:] = 0
+        columns.price[n:] = np.nan
+        columns.carpet[n:] = np.nan
+        live = np.arange(capacity) < n
+        columns.alive = _bitmap(live)
+        columns.favorite = _bitmap(np.concatenate([favorite, np.zeros(capacity - n, dtype=bool)]).astype(bool))
+        for field in FACET_FIELDS:
+            codes = columns.codes[field]
+            columns.bitmaps[field] = np.stack([
+                _bitmap((codes == code) & live) for code in range(len(columns.values[field]))
+            ])
+        return columns
+
+
+class ColumnarSnapshot:
+    """Columnar listing snapshot answering filter and facet count queries"""
+
+    def __init__(self, refresh_seconds: float = SNAPSHOT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        # Allocated by the first load
+        self._columns: Optional[_Columns] = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # Events seen while a rebuild is running, replayed onto the new columns
+        self._pending: Optional[List[Dict]] = None
+        self._refreshing = False
+
+    def __len__(self):
+        return len(self._columns.rows) if self._columns is not None else 0
+
+    def load(self, documents: Iterable[Dict]):
+        """(Re)build the snapshot from property documents"""
+        with self._lock:
+            self._pending = []
+        try:
+            columns = _Columns.build(documents)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            # Writes that raced with the MongoDB scan are folded in before the swap
+            for event in self._pending:
+                self._apply(columns, event)
+            self._pending = None
+            self._columns = columns
+            self._loaded_at = time.monotonic()
+
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def refresh_in_background(self, fetch_documents: Callable[[], Iterable[Dict]]) -> bool:
+        """
+        Rebuild in a background thread if the snapshot is stale and no rebuild
+        is running; queries keep using the current columns until the swap.
+        Returns True if a rebuild was started.
+        """
+        with self._lock:
+            if self._refreshing or not self.is_stale():
+                return False
+            self._refreshing = True
+
+        def rebuild():
+            try:
+                self.load(fetch_documents())
+            except Exception as e:
+                print(f"Facet snapshot rebuild failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=rebuild, name="snapshot-rebuild", daemon=True).start()
+        return True
+
+    def upsert(self, doc: Dict):
+        with self._lock:
+            if self._columns is not None:
+                self._columns.upsert(doc)
+
+    def remove(self, listing_id: str):
+        with self._lock:
+            if self._columns is not None:
+                self._columns.remove(listing_id)
+
+    def apply_event(self, event: Dict):
+        """Bus listener: fold a live event into the snapshot"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+            if self._columns is not None:
+                self._apply(self._columns, event)
+
+    @staticmethod
+    def _apply(columns: _Columns, event: Dict):
+        data = event["data"]
+        if event["event"] in ("insert", "update") and data.get("property"):
+            columns.upsert(data["property"])
+        elif event["event"] == "delete":
+            columns.remove(data["id"])
+        elif event["event"] == "bulk_update" and "is_favorite" in data.get("fields", {}):
+            columns.set_favorite(data["ids"], bool(data["fields"]["is_favorite"]))
+
+    def query(self, equals: Dict[str, str], favorites: Optional[bool] = None,
+              price_min: Optional[float] = None, price_max: Optional[float] = None,
+              carpet_min: Optional[float] = None, carpet_max: Optional[float] = None,
+              limit: int = 50) -> Dict:
+        """
+        Filter by exact categorical values, favorite status and numeric ranges.
+        Each field's facet counts ignore that field's own filter, so the UI can
+        show how many listings every alternative value would give.
+        """
+        with self._lock:
+            columns = self._columns
+            base = columns.alive.copy()
+            if favorites is not None:
+                base &= columns.favorite if favorites else ~columns.favorite
+            # NaN compares False, so listings without a value drop out of ranges
+            for values, low, high in ((columns.price, price_min, price_max),
+                                      (columns.carpet, carpet_min, carpet_max)):
+                if low is not None:
+                    base &= _bitmap(values >= low)
+                if high is not None:
+                    base &= _bitmap(values <= high)
+
+            masks = {}
+            for field, value in equals.items():
+                code = columns.lookup[field].get(None if value == UNKNOWN else value)
+                masks[field] = columns._empty() if code is None else columns.bitmaps[field][code]
+
+            matched = base.copy()
+            for mask in masks.values():
+                matched &= mask
+
+            facets = {}
+            for field in FACET_FIELDS:
+                scope = matched
+                if field in masks:
+                    scope = base.copy()
+                    for other, mask in masks.items():
+                        if other != field:
+                            scope &= mask
+                # One vectorized AND + popcount over every value's bitmap
+                counts = np.bitwise_count(columns.bitmaps[field] & scope).sum(axis=1)
+                facets[field] = {
+                    (value if value is not None else UNKNOWN): int(count)
+                    for value, count in zip(columns.values[field], counts) if count
+                }
+
+            # Rows are in insertion order, so the highest set bits are the newest
+            ids = []
+            for word_index in np.flatnonzero(matched)[::-1]:
+                word = int(matched[word_index])
+                while word and len(ids) < limit:
+                    bit = word.bit_length() - 1
+                    ids.append(columns.ids[word_index * 64 + bit])
+                    word ^= 1 << bit
+                if len(ids) >= limit:
+                    break
+
+            return {
+                "total": _popcount(matched),
+                "favorites": _popcount(matched & columns.favorite),
+                "facets": facets,
+                "ids": ids,
+            }
+
+
+snapshot = ColumnarSnapshot()
@@ -0,0 +1,42 @@
+"""
+Tests for the admission control token buckets and client keys
+"""
+
+from admission import MemoryBucketStore, SQLiteBucketStore, _refill, client_key
+
+
+def test_refill_allows_burst_then_waits_for_tokens():
+    tokens, allowed, _ = _refill(None, 0, 0, rate=1.0, burst=2, cost=1)
+    assert allowed and tokens == 1
+    tokens, allowed, _ = _refill(tokens, 0, 0, rate=1.0, burst=2, cost=1)
+    assert allowed and tokens == 0
+    tokens, allowed, retry_after = _refill(tokens, 0, 0, rate=1.0, burst=2, cost=1)
+    assert not allowed and retry_after == 1.0
+    # Refills at `rate` per second, capped at the burst
+    tokens, allowed, _ = _refill(0, 0, 100, rate=1.0, burst=2, cost=1)
+    assert allowed and tokens == 1
+
+
+def _exhaust(store, key):
+    return [store.take(key, rate=0.001, burst=3)[0] for _ in range(5)]
+
+
+def test_memory_store_limits_per_key():
+    store = MemoryBucketStore()
+    assert _exhaust(store, "a") == [True, True, True, False, False]
+    assert store.take("b", rate=0.001, burst=3)[0]
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert _exhaust(first, "a")[:3] == [True, True, True]
+    allowed, retry_after = second.take("a", rate=0.001, burst=3)
+    assert not allowed and retry_after > 0
+
+
+def test_client_key_ignores_unknown_api_keys():
+    scope = {"headers": [(b"x-api-key", b"made-up")], "client": ("10.0.0.1", 1234)}
+    assert client_key(scope, frozenset({"real"})) == "ip:10.0.0.1"
+    scope["headers"] = [(b"x-api-key", b"real")]
+    assert client_key(scope, frozenset({"real"})).startswith("key:")
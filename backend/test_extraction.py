@@ -3,8 +3,9 @@ Test script to demonstrate AI property extraction
 Run this to see how the AI extracts property details
 """
 
-from ai_extractor import extractor
+from ai_extractor import PropertyExtractor, extractor
 import json
+import time
 
 # Test messages
 test_messages = [
@@ -54,6 +55,36 @@ test_messages = [
     """
 ]
 
+# Broker blast with several listings in one message
+broker_blast = """
+Fresh inventory from Sai Realty - call 9820012345
+1. 2BHK Andheri West rent 45k, 750 sqft
+2. 1RK Malad East rent 12k
+3) 3BHK for sale in Borivali, 1.8 Cr, fully furnished, 9876543210
+4. Shop for rent Dadar 60k
+"""
+
+# (message, expected listing_intent). Offers that use demand words for their
+# tenant or buyer must stay offers.
+intent_cases = [
+    ("2BHK for rent in Andheri, family needed, 35k", "Offer"),
+    ("Shop for rent Dadar, no deposit needed, 60k", "Offer"),
+    ("Wanted: tenants for 1BHK in Malad 20k", "Offer"),
+    ("3BHK for sale in Borivali, 1.8 Cr, within your budget", "Offer"),
+    ("Tenant required for 2BHK in Goregaon, 30k", "Offer"),
+    ("Looking for tenants for my 2BHK in Andheri, 35k", "Offer"),
+    ("Owner looking for buyer, 3BHK Borivali 1.8 Cr", "Offer"),
+    ("in search of tenant for shop in Dadar", "Offer"),
+    ("Urgent requirement of tenant for 2BHK", "Offer"),
+    ("1 BHK flat rent pe chahiye, Kandivali, Budget 25k tak", "Requirement"),
+    ("Looking for 2BHK for rent in Andheri West, budget 40k", "Requirement"),
+    ("2BHK required on rent in Bandra", "Requirement"),
+    ("Client needs flat in Malad, budget 1 Cr", "Requirement"),
+    ("Need urgently, budget 30k, Andheri", "Requirement"),
+    ("Flat wanted in Bandra", "Requirement"),
+    ("2BHK needed on rent in Powai", "Requirement"),
+]
+
 def test_extraction():
     print("=" * 80)
     print("REAL ESTATE AI - PROPERTY EXTRACTION TEST")
@@ -84,6 +115,7 @@ def test_extraction():
         print(f"Carpet Area:      {result['carpet_area']}")
         print(f"Furnishing:       {result['furnishing']}")
         print(f"Contact:          {result['contact_number']}")
+        print(f"Intent:           {result['listing_intent']}")
         print(f"Confidence:       {result['confidence_score']}%")
         print("-" * 80)
         
@@ -99,8 +131,85 @@ def test_extraction():
         print(f"\nExtraction Quality: {quality}")
         print()
 
+def test_multi_listing_split():
+    listings, dropped = extractor.extract_listings(broker_blast)
+    assert dropped == 0
+    assert [(l['bhk'], l['area'], l['price']) for l in listings] == [
+        ("2BHK", "Andheri", "45k"),
+        ("1BHK", "Malad", "12k"),
+        ("3BHK", "Borivali", "1.8 Cr"),
+        ("Shop", "Dadar", "60k"),
+    ]
+    # Blocks without a number of their own inherit the preamble's
+    assert [l['contact_number'] for l in listings] == [
+        "9820012345", "9820012345", "9876543210", "9820012345"
+    ]
+    assert [l.get('inherited_fields') for l in listings] == [
+        ['contact_number'], ['contact_number'], None, ['contact_number']
+    ]
+
+def test_emoji_decorated_listing_stays_whole():
+    # Every line starts with an emoji, some naming a property type, but it is
+    # one listing
+    message = (
+        "🏠 2BHK flat for rent in Andheri West\n"
+        "🛋️ Semi furnished flat, 750 sqft\n"
+        "💰 Rent 45k, deposit 1.5L\n"
+        "✅ Family only\n"
+        "📞 9820012345"
+    )
+    listings, dropped = extractor.extract_listings(message)
+    assert dropped == 0
+    assert len(listings) == 1
+    assert listings[0]['bhk'] == "2BHK"
+    assert listings[0]['price'] == "45k"
+    assert listings[0]['contact_number'] == "9820012345"
+
+def test_listing_intent():
+    for message, expected in intent_cases:
+        result = extractor.extract_property_details(message)
+        assert result['listing_intent'] == expected, message
+
+# Inputs that made the old patterns backtrack; each must finish well within a
+# second (normal messages take well under a millisecond)
+pathological_messages = [
+    "a" * 50000,
+    "1," * 25000,
+    "Rent " + " " * 50000 + "x",
+    "2BHK in " + "Andheri " * 6000,
+    "Price: " + "9" * 50000,
+]
+
+def test_pathological_inputs_run_in_bounded_time():
+    for message in pathological_messages:
+        start = time.perf_counter()
+        result = extractor.extract_property_details(message)
+        assert time.perf_counter() - start < 0.5, message[:20]
+        assert result['input_truncated']
+
+def test_long_blast_is_bounded_and_flagged():
+    blast = "\n".join(f"{i}. 2BHK Andheri West rent {i}k, 750 sqft, " + "x" * 700 for i in range(1, 80))
+    assert len(blast) > 50000
+    start = time.perf_counter()
+    listings, dropped = extractor.extract_listings(blast)
+    assert time.perf_counter() - start < 1.0
+    assert 0 < len(listings) <= 50
+    assert listings[-1]['input_truncated']
+
+def test_region_for_area():
+    assert extractor.region_for_area('Andheri') == extractor.extract_property_details('2BHK in Andheri')['region']
+    assert extractor.region_for_area('thane') == 'Central'
+    assert extractor.region_for_area('Nowhere') is None
+
+def test_time_budget_marks_partial_results():
+    exhausted = PropertyExtractor(time_budget_ms=0)
+    result = exhausted.extract_property_details(test_messages[0])
+    assert result['extraction_partial']
+    assert not extractor.extract_property_details(test_messages[0])['extraction_partial']
+
 if __name__ == "__main__":
     test_extraction()
+    test_multi_listing_split()
     
     print("\n" + "=" * 80)
     print("Test complete! Start the FastAPI server to use the full application.")
@@ -0,0 +1,50 @@
+"""
+Tests for the BK-tree photo hash index
+"""
+
+import random
+
+from image_index import BKTree, ImageIndex, hamming
+
+
+def test_bktree_search_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(2000)]
+    # Near-duplicates of the first few hashes
+    hashes += [h ^ (1 << rng.randrange(64)) for h in hashes[:50]]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, str(i))
+
+    for query in hashes[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        expected = sorted((hamming(query, h), str(i)) for i, h in enumerate(hashes) if hamming(query, h) <= 6)
+        assert tree.search(query, 6) == expected
+
+
+def test_index_skips_self_and_removed_listings():
+    index = ImageIndex()
+    index.load([
+        {"_id": "a", "image_hash": "ffffffffffffffff"},
+        {"_id": "b", "image_hash": "fffffffffffffffe"},
+        {"_id": "c", "image_hash": "0000000000000000"},
+    ])
+    assert index.similar("ffffffffffffffff", exclude="a") == [{"id": "b", "distance": 1}]
+    index.remove("b")
+    assert index.similar("ffffffffffffffff", exclude="a") == []
+    # A re-upload replaces the old hash
+    index.add("c", "fffffffffffffffc")
+    assert [m["id"] for m in index.similar("ffffffffffffffff")] == ["a", "c"]
+
+
+def test_changes_during_rebuild_are_replayed():
+    index = ImageIndex()
+    index.load([{"_id": "a", "image_hash": "ffffffffffffffff"}])
+
+    def documents():
+        # Snapshot read before the upload and removal below reached MongoDB
+        yield {"_id": "a", "image_hash": "ffffffffffffffff"}
+        index.add("b", "fffffffffffffffe")
+        index.remove("a")
+
+    index.load(documents())
+    assert index.similar("ffffffffffffffff") == [{"id": "b", "distance": 1}]
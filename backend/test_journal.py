@@ -0,0 +1,76 @@
+"""
+Tests for the write-behind ingest journal
+"""
+
+from bson import ObjectId
+
+from journal import IngestJournal, WriteBehindWriter
+
+
+def listing(price):
+    return {"_id": ObjectId(), "bhk": "2BHK", "price": price}
+
+
+def test_append_pending_acknowledge(tmp_path):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite3"))
+    docs = [listing("45k"), listing("50k"), listing("55k")]
+    journal.append(docs)
+
+    pending = journal.pending()
+    assert [doc for _, doc in pending] == docs
+    assert journal.count() == 3
+
+    journal.acknowledge([seq for seq, _ in pending[:2]])
+    assert [doc for _, doc in journal.pending()] == docs[2:]
+    assert journal.pending(limit=0) == []
+
+
+def test_reopened_journal_replays_pending(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    docs = [listing("45k"), listing("50k")]
+    IngestJournal(path).append(docs)
+
+    # A restart sees exactly what was acknowledged to clients, ids included
+    reopened = IngestJournal(path)
+    assert [doc for _, doc in reopened.pending()] == docs
+
+
+def test_dead_letter_leaves_pending(tmp_path):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite3"))
+    docs = [listing("45k"), listing("50k")]
+    journal.append(docs)
+    (bad_seq, _), (good_seq, _) = journal.pending()
+
+    journal.dead_letter([(bad_seq, "validation failed")])
+    assert [seq for seq, _ in journal.pending()] == [good_seq]
+    row = journal._conn.execute(
+        "SELECT property_id, error FROM dead_letter WHERE seq = ?", (bad_seq,)
+    ).fetchone()
+    assert row == (str(docs[0]["_id"]), "validation failed")
+
+
+def test_get_returns_latest_pending_version(tmp_path):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite3"))
+    doc = listing("45k")
+    journal.append([doc])
+    journal.append([{**doc, "price": "42k"}])
+
+    assert journal.get(str(doc["_id"]))["price"] == "42k"
+    assert journal.get(str(ObjectId())) is None
+
+    journal.acknowledge([seq for seq, _ in journal.pending()])
+    assert journal.get(str(doc["_id"])) is None
+
+
+def test_flush_hands_accepted_documents_to_follow_up(tmp_path, monkeypatch):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite3"))
+    docs = [listing("45k"), listing("bad"), listing("55k")]
+    journal.append(docs)
+    # MongoDB rejects the second document
+    monkeypatch.setattr("journal.insert_journaled_properties", lambda batch: [(1, "validation failed")])
+    flushed = []
+    writer = WriteBehindWriter(journal, on_flushed=flushed.extend)
+
+    assert writer.flush() == 3
+    assert flushed == [docs[0], docs[2]]
+    assert journal.count() == 0
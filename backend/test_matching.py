@@ -0,0 +1,41 @@
+"""
+Tests for requirement/offer matching
+"""
+
+from matching import BUDGET_HIGH_RATIO, MatchingEngine, price_band
+
+
+def _listing(listing_id, intent, price, area='Andheri', bhk='2BHK', transaction='Rent', region='Western'):
+    return {'_id': listing_id, 'listing_intent': intent, 'transaction_type': transaction,
+            'bhk': bhk, 'area': area, 'region': region, 'price_value': price,
+            'created_at': listing_id}
+
+
+def test_price_bands_are_monotonic():
+    assert price_band(None) is None
+    assert price_band(20000) <= price_band(25000) <= price_band(1.5e7)
+
+
+def test_requirement_gets_offers_within_budget_ranked():
+    engine = MatchingEngine()
+    engine.load([
+        _listing('same-area', 'Offer', 30000),
+        _listing('same-region', 'Offer', 30000, area='Malad'),
+        _listing('over-budget', 'Offer', 30000 * BUDGET_HIGH_RATIO * 1.5),
+        _listing('wrong-bhk', 'Offer', 30000, bhk='1BHK'),
+        _listing('sale', 'Offer', 30000, transaction='Sale'),
+    ])
+    matches = engine.match_requirement(_listing('req', 'Requirement', 30000))
+    assert [m['id'] for m in matches] == ['same-area', 'same-region']
+    assert matches[0]['match_score'] > matches[1]['match_score']
+
+
+def test_offer_finds_requirements_and_index_follows_changes():
+    engine = MatchingEngine()
+    engine.load([_listing('req', 'Requirement', 40000)])
+    offer = _listing('offer', 'Offer', 38000)
+    assert [m['id'] for m in engine.match_offer(offer)] == ['req']
+    engine.remove('req')
+    assert engine.match_offer(offer) == []
+    engine.add(_listing('req2', 'Requirement', 36000))
+    assert [m['id'] for m in engine.match_offer(offer)] == ['req2']
@@ -0,0 +1,52 @@
+"""
+Tests for the re-extraction job's per-listing update rules
+"""
+
+from ai_extractor import extractor
+from reextract import reextract_batch
+
+BLAST = """
+Fresh inventory from Sai Realty - call 9820012345
+1. 2BHK Andheri West rent 45k, 750 sqft
+2. 1RK Malad East rent 12k
+"""
+
+
+def _stored_listing(message, **fields):
+    listing = {"_id": 1, **extractor.extract_property_details(message), **fields}
+    listing["extractor_version"] = "old"
+    return listing
+
+
+def test_inherited_contact_survives_reextraction():
+    listings, _ = extractor.extract_listings(BLAST)
+    block = listings[1]
+    assert block["raw_message"] == "2. 1RK Malad East rent 12k"
+    assert block["contact_number"] == "9820012345"
+    assert block["inherited_fields"] == ["contact_number"]
+
+    [update] = reextract_batch([{**block, "_id": 1, "extractor_version": "old"}])
+    assert "contact_number" not in update["fields"]
+
+
+def test_missing_match_never_clears_a_stored_value():
+    # Stored before the field was inherited-tracked
+    doc = _stored_listing("2. 1RK Malad East rent 12k", contact_number="9820012345")
+    [update] = reextract_batch([doc])
+    assert "contact_number" not in update["fields"]
+
+
+def test_hand_edits_are_kept():
+    doc = _stored_listing("2BHK for rent in Andheri West, 35k", price="40k", price_value=40000,
+                          edited_fields=["price"])
+    [update] = reextract_batch([doc])
+    assert "price" not in update["fields"] and "price_value" not in update["fields"]
+
+
+def test_changed_transaction_type_recomputes_expiry():
+    doc = _stored_listing("3BHK for sale in Borivali, 1.8 Cr", transaction_type="Rent",
+                          created_at="2026-01-01T00:00:00")
+    [update] = reextract_batch([doc])
+    assert update["fields"]["transaction_type"] == "Sale"
+    # Sale listings live 90 days from when they were saved
+    assert update["fields"]["expires_at"].startswith("2026-04-01")
@@ -0,0 +1,89 @@
+"""
+Tests for the columnar facet snapshot, checked against plain Python filtering
+"""
+
+import random
+
+from snapshot import FACET_FIELDS, UNKNOWN, ColumnarSnapshot, carpet_sqft
+
+VALUES = {
+    'property_type': ['Residential', 'Commercial', None],
+    'transaction_type': ['Rent', 'Sale'],
+    'bhk': ['1BHK', '2BHK', '3BHK', None],
+    'region': ['Western', 'Central', 'Harbour'],
+    'listing_intent': ['Offer', 'Requirement'],
+    'furnishing': ['Furnished', 'Unfurnished', None],
+}
+
+
+def _documents(count, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            '_id': f'p{i}',
+            **{field: rng.choice(VALUES[field]) for field in FACET_FIELDS},
+            'is_favorite': rng.random() < 0.2,
+            'price_value': rng.choice([None, rng.randrange(10000, 5000000)]),
+            'carpet_area': rng.choice([None, f'{rng.randrange(200, 2000)} sq ft']),
+        }
+        for i in range(count)
+    ]
+
+
+def _expected(documents, equals, favorites=None, price_min=None):
+    def matches(doc, skip=None):
+        for field, value in equals.items():
+            if field != skip and (doc.get(field) or UNKNOWN) != value:
+                return False
+        if favorites is not None and doc['is_favorite'] != favorites:
+            return False
+        if price_min is not None and not (doc['price_value'] or 0) >= price_min:
+            return False
+        return True
+
+    facets = {}
+    for field in FACET_FIELDS:
+        counts = {}
+        for doc in documents:
+            if matches(doc, skip=field):
+                value = doc.get(field) or UNKNOWN
+                counts[value] = counts.get(value, 0) + 1
+        facets[field] = counts
+    return sum(1 for doc in documents if matches(doc)), facets
+
+
+def test_query_matches_brute_force():
+    # More than the initial capacity, so the bitmaps span several words
+    documents = _documents(3000)
+    snapshot = ColumnarSnapshot()
+    snapshot.load(documents)
+    for equals, favorites, price_min in [
+        ({}, None, None),
+        ({'bhk': '2BHK'}, None, None),
+        ({'bhk': '2BHK', 'region': 'Western'}, True, None),
+        ({'furnishing': UNKNOWN}, None, 1000000),
+    ]:
+        result = snapshot.query(equals, favorites, price_min=price_min, limit=10)
+        total, facets = _expected(documents, equals, favorites, price_min)
+        assert result['total'] == total
+        assert result['facets'] == facets
+        assert len(result['ids']) == min(10, total)
+
+
+def test_events_update_the_snapshot():
+    documents = _documents(100)
+    snapshot = ColumnarSnapshot()
+    snapshot.load(documents)
+    new = {**documents[0], '_id': 'new', 'bhk': '3BHK'}
+    snapshot.apply_event({'event': 'insert', 'data': {'property': new}})
+    snapshot.apply_event({'event': 'delete', 'data': {'id': 'p1'}})
+    documents = [new] + [doc for doc in documents if doc['_id'] != 'p1']
+    assert snapshot.query({'bhk': '3BHK'})['total'] == _expected(documents, {'bhk': '3BHK'})[0]
+    # Newest rows come first
+    assert snapshot.query({}, limit=1)['ids'] == ['new']
+
+
+def test_carpet_sqft():
+    assert carpet_sqft('1,200 sq ft') == 1200.0
+    assert carpet_sqft(850) == 850.0
+    assert carpet_sqft('large') != carpet_sqft('large')  # NaN
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { MessageSquare, Search, Home, TrendingUp, Star, Plus } from 'lucide-react';
 import { propertyService } from './services/api';
 import PropertyInput from './components/PropertyInput';
@@ -7,12 +7,33 @@ import PropertyFilters from './components/PropertyFilters';
 import Dashboard from './components/Dashboard';
 import './styles/App.css';
 
+const applyStatsDelta = (stats, delta) => {
+  if (!stats || !delta) return stats;
+  const merge = (counts, changes) => {
+    const merged = { ...counts };
+    Object.entries(changes).forEach(([key, change]) => {
+      merged[key] = (merged[key] || 0) + change;
+      if (merged[key] <= 0) delete merged[key];
+    });
+    return merged;
+  };
+  return {
+    ...stats,
+    total_properties: stats.total_properties + delta.total_properties,
+    favorites: stats.favorites + delta.favorites,
+    by_type: merge(stats.by_type, delta.by_type),
+    by_transaction: merge(stats.by_transaction, delta.by_transaction),
+  };
+};
+
 function App() {
   const [activeTab, setActiveTab] = useState('input');
   const [properties, setProperties] = useState([]);
   const [stats, setStats] = useState(null);
   const [filters, setFilters] = useState({});
   const [loading, setLoading] = useState(false);
+  const viewRef = useRef({ activeTab, filters });
+  viewRef.current = { activeTab, filters };
 
   useEffect(() => {
     if (activeTab === 'list') {
@@ -22,10 +43,12 @@ function App() {
     }
   }, [activeTab, filters]);
 
+  // Reads filters from viewRef so callers holding an older render's copy
+  // (the live-events subscription) still load the current view
   const loadProperties = async () => {
     try {
       setLoading(true);
-      const data = await propertyService.getProperties(filters);
+      const data = await propertyService.getProperties(viewRef.current.filters);
       setProperties(data);
     } catch (error) {
       console.error('Error loading properties:', error);
@@ -46,6 +69,39 @@ function App() {
     }
   };
 
+  // Apply live deltas instead of re-downloading the list and stats
+  useEffect(() => {
+    const reloadActiveTab = () => {
+      if (viewRef.current.activeTab === 'list') {
+        loadProperties();
+      } else if (viewRef.current.activeTab === 'dashboard') {
+        loadStats();
+      }
+    };
+
+    return propertyService.subscribeToChanges((type, data) => {
+      if (type === 'resync' || type === 'bulk_update' || data.resync_stats) {
+        reloadActiveTab();
+        return;
+      }
+      setStats((current) => applyStatsDelta(current, data.stats_delta));
+      if (type === 'insert') {
+        const hasFilters = Object.values(viewRef.current.filters).some(Boolean);
+        if (!hasFilters) {
+          setProperties((current) => [data.property, ...current]);
+        }
+      } else if (type === 'update') {
+        setProperties((current) =>
+          current.map((p) => (p.id === data.id ? { ...p, ...data.property } : p))
+        );
+      } else if (type === 'delete') {
+        setProperties((current) => current.filter((p) => p.id !== data.id));
+      }
+    });
+    // Subscribe once: the handler and the loaders only read the view through viewRef
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
   const handlePropertySaved = () => {
     if (activeTab === 'list') {
       loadProperties();
@@ -69,6 +69,16 @@ export const propertyService = {
     const response = await api.get('/api/stats');
     return response.data;
   },
+
+  // Subscribe to live property changes (Server-Sent Events). The browser
+  // reconnects automatically and resumes from the last event it saw.
+  subscribeToChanges: (onEvent) => {
+    const source = new EventSource(`${API_BASE_URL}/api/properties/stream`);
+    ['insert', 'update', 'delete', 'bulk_update', 'resync'].forEach((type) => {
+      source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+    });
+    return () => source.close();
+  },
 };
 
 export default api;